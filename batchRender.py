@@ -0,0 +1,206 @@
+# BATCH RENDER
+# Headless entry point: renders videos from job files without opening the window (no PyQt5 needed).
+#   python batchRender.py job.json              Renders one job
+#   python batchRender.py jobs/ more.yaml       Renders every .json/.yaml/.yml file given, back-to-back on one warm server
+#   python batchRender.py jobs/ --parallel 2    Renders two jobs at a time (worth it with several WEBUI_BACKENDS)
+#   python batchRender.py jobs/ --resume        Carries on after a crash: finished jobs are skipped, the one that was cut off
+#                                               continues from its last good frame
+#   python batchRender.py job.json --draft      Quick preview at lower resolution and steps (--stride 2 renders every 2nd frame),
+#                                               in output-jobs/job-draft
+#   python batchRender.py jobs/ --plan          Prints every job's frame schedule (pivots, denoise curve, requests) and how
+#                                               long it should take (learned from archived jobs), then exits
+#   python batchRender.py --refine output-archive/2024-01-01_12-00-00
+#                                               Renders the full video an approved draft (archived or in its output folder)
+#                                               previews, with the exact settings the draft was made from (in
+#                                               output-jobs/2024-01-01_12-00-00-refined)
+#
+# A job file has the same fields the window collects (see VideoGeneratorUI.collect_inputs), for example:
+#   {"resolution_x": 640, "resolution_y": 640, "fps": 12, "steps": 30, "cfg_scale": 25, "minimum_denoise_strength": 0.35,
+#    "use_original_seed": false, "upscale": true, "upscale_fps": 60, "loop": true, "seed_image": "seed.png",
+#    "prompts": ["black hole acretion disk", "intricate coral reef"], "styles": ["Surrealism", "Cubism"],
+#    "noise_amps": [0.5, 0.6], "timestamps": [24, 48]}
+# timestamps are cumulative frame counts (pivot 2 above runs from frame 25 to 48). seed_image is relative to the job file
+# and can be left out to reuse the previous seed. Missing fields use the defaults in renderEngine.py. Add "sampler_seed": 1234
+# to make frames repeatable, rendering the job again then takes unchanged frames from the response cache.
+# type: ignore
+import argparse
+import json
+import os
+import sys as pysys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import renderEngine as engine
+from etaEstimator import format_duration
+
+CURVE_LEVELS = ' ▁▂▃▄▅▆▇█'                   # Characters the denoise curve is drawn with in --plan, lowest to highest
+CURVE_WIDTH = 60                            # Characters per line of the curve
+SERVER_TIMEOUT = 600                        # Seconds to wait for the webui to start
+JOB_EXTENSIONS = ('.json', '.yaml', '.yml') # Files picked up from job folders
+JOBS_OUTPUT_PATH = 'output-jobs'            # Each job gets its own output folder in here, named after the job file
+
+def load_job(path):
+    """Reads a JSON or YAML job file. Relative seed image paths are made relative to the job file"""
+
+    with open(path) as job_file:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml # Only needed for YAML jobs
+            except ImportError:
+                raise ValueError(f"{path} is YAML but PyYAML is not installed (pip install pyyaml)")
+            spec = yaml.safe_load(job_file)
+        else:
+            spec = json.load(job_file)
+
+    if spec.get("seed_image") and not os.path.isabs(spec["seed_image"]):
+        spec["seed_image"] = os.path.join(os.path.dirname(os.path.abspath(path)), spec["seed_image"])
+    return spec
+
+def find_jobs(paths):
+    """Expands folders into the job files inside them (sorted by name), keeping the order paths were given in"""
+
+    jobs = []
+    for path in paths:
+        if os.path.isdir(path):
+            jobs += sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(JOB_EXTENSIONS))
+        else:
+            jobs.append(path)
+    return jobs
+
+def wait_for_server(timeout):
+    """Waits until a webui backend answers. Returns False if it doesn't within timeout seconds"""
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if engine.backends.is_ready():
+            return True
+        time.sleep(1)
+    return False
+
+def output_dirs(jobs, suffix=''):
+    """Names each job's output folder after its file (job.json -> output-jobs/job{suffix}), numbering repeated names"""
+
+    dirs, seen = [], {}
+    for path in jobs:
+        name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0] + suffix
+        seen[name] = seen.get(name, 0) + 1
+        dirs.append(f"{JOBS_OUTPUT_PATH}/{name}" + (f"_{seen[name]}" if seen[name] > 1 else ""))
+    return dirs
+
+def job_spec(path, draft=False, stride=engine.DRAFT_STRIDE, refine=False):
+    """Spec to render for path: a job file as it is or as a draft, or the full spec of the draft in the folder path"""
+
+    if refine:
+        return engine.refine_spec(path)
+    spec = load_job(path)
+    return engine.draft_spec(spec, stride=stride) if draft else spec
+
+def print_plan(path, spec, costs=None):
+    """Prints what a job will generate (see FrameSchedule) without sending anything to the server, and how long it should
+       take if costs (see engine.learn_stage_costs) has past jobs to go by"""
+
+    job = engine.RenderJob(spec)
+    schedule = job.schedule
+    print(f"\n{path}: {job.total_frames} frames at {job.resolution_x} x {job.resolution_y}, {job.steps} steps" +
+          (f" (draft, every {job.frame_stride} frames)" if job.draft_of else ""))
+    for pivot in range(len(job.prompts)):
+        frames = schedule.pivot_frames(pivot)
+        if len(frames) == 0:
+            print(f"  Pivot {pivot + 1}: no frames")
+            continue
+        strength = schedule.strength[frames - 1]
+        print(f"  Pivot {pivot + 1}: frames {frames[0]}-{frames[-1]}, denoise {strength[0]:.3f} -> {strength[-1]:.3f}, "
+              f"{job.prompts[pivot]} ({job.styles[pivot]})")
+
+    # Denoise curve from 0 to 1, one character per frame (per few frames for long videos, at most 4 lines)
+    step = max(1, -(-job.total_frames // (CURVE_WIDTH * 4)))
+    for start in range(0, job.total_frames, CURVE_WIDTH * step):
+        levels = schedule.strength[start:start + CURVE_WIDTH * step:step] * (len(CURVE_LEVELS) - 1)
+        print('  |' + ''.join(CURVE_LEVELS[int(round(level))] for level in levels) + f'| from frame {start + 1}')
+    from_seed = int((schedule.init_frame == 0).sum())
+    source = ("every frame from the seed image" if from_seed == job.total_frames else
+              f"{from_seed} from the seed image, the rest from the frame before")
+    print(f"  {job.total_frames} requests, {job.total_frames * job.steps} sampling steps "
+          f"({job.total_frames * job.steps * job.resolution_x * job.resolution_y / 1e6:.1f} megapixel-steps), {source}")
+    estimate = job.estimate(costs)
+    if estimate is None:
+        print("  Estimated time: unknown until a job is archived")
+    else:
+        print(f"  Estimated time: {format_duration(estimate)} (from {costs.jobs} archived jobs)")
+
+def render(path, output_dir, label, resume=False, draft=False, stride=engine.DRAFT_STRIDE, refine=False):
+    """Renders one job file (see job_spec). Returns the path if it failed, None if it finished"""
+
+    print(f"\nJob {label}: {path}")
+    try:
+        job = engine.run_job(job_spec(path, draft, stride, refine), output_dir, resume)
+        print(f"Finished {path}, archived as {engine.ARCHIVE_PATH}/{job.date}")
+    except Exception as e: # One broken job shouldn't stop the rest of the batch
+        print(f"[ERROR] Job {path} failed: {e}")
+        traceback.print_exc()
+        return path
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Render videos from job files without the window.")
+    parser.add_argument('jobs', nargs='+', help='job files (.json/.yaml) or folders of them')
+    parser.add_argument('--no-server', action='store_true', help="don't start the local webui, use WEBUI_BACKENDS as they are")
+    parser.add_argument('--parallel', type=int, default=1, help='jobs rendered at the same time (default 1)')
+    parser.add_argument('--resume', action='store_true', help='skip jobs already rendered and continue interrupted ones')
+    parser.add_argument('--draft', action='store_true', help='render quick low resolution previews of the jobs')
+    parser.add_argument('--stride', type=int, default=engine.DRAFT_STRIDE, help='with --draft, render every Nth frame')
+    parser.add_argument('--refine', action='store_true', help='jobs are draft folders, render the full videos they preview')
+    parser.add_argument('--plan', action='store_true', help="print each job's frame schedule and cost, don't render")
+    args = parser.parse_args()
+    if args.draft and args.refine:
+        parser.error('--draft and --refine can\'t be used together')
+
+    jobs = list(args.jobs) if args.refine else find_jobs(args.jobs)
+    if not jobs:
+        print("No job files found.")
+        return 1
+
+    if args.plan:
+        costs = engine.learn_stage_costs()
+        failed = []
+        for path in jobs:
+            try:
+                print_plan(path, job_spec(path, args.draft, args.stride, args.refine), costs)
+            except Exception as e: # Like render, one broken job file shouldn't hide the plans of the rest
+                print(f"\n[ERROR] Can't plan {path}: {e}")
+                failed.append(path)
+        if failed:
+            print(f"\n{len(failed)}/{len(jobs)} job files couldn't be planned.")
+        return 1 if failed else 0
+
+    started_server = False
+    if not args.no_server and not engine.backends.is_ready():
+        engine.start_local_server()
+        started_server = True
+
+    failed = []
+    try:
+        print("Waiting for server...")
+        if not wait_for_server(SERVER_TIMEOUT):
+            print(f"[ERROR] No webui answered within {SERVER_TIMEOUT} seconds.")
+            return 1
+
+        engine.clearOutput() # Creates the shared folders (archive, seed image)
+        dirs = output_dirs(jobs, '-draft' if args.draft else '-refined' if args.refine else '')
+        renders = [(path, output_dir, f"{i + 1}/{len(jobs)}", args.resume, args.draft, args.stride, args.refine)
+                   for i, (path, output_dir) in enumerate(zip(jobs, dirs))]
+        with ThreadPoolExecutor(max_workers=max(args.parallel, 1)) as pool:
+            failed = [path for path in pool.map(lambda job: render(*job), renders) if path]
+    finally:
+        engine.backends.close()
+        if started_server:
+            engine.stop_local_server() # Frees the 4-6 gigabytes the server uses
+
+    print(f"\n{len(jobs) - len(failed)}/{len(jobs)} jobs finished.")
+    for path in failed:
+        print(f" - failed: {path}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    pysys.exit(main())
@@ -0,0 +1,88 @@
+# ALPHA MASK BENCHMARK
+# Times putting the seed's alpha channel back on a long video's frames and into the archive: the old apply_masks (one frame
+# after another, copied through NumPy, then the folder copied to the archive), the new one in this process and split across
+# a pool of processes, and a fully opaque seed (frames are just copied). Checks the masked frames come out byte for byte the
+# same every way.
+# Run from the project folder: python benchmarks/alphaMasks.py [--frames 1000] [--size 256] [--workers 4]
+# type: ignore
+import argparse
+import hashlib
+import os
+import shutil
+import sys as pysys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+pysys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import renderEngine as engine
+
+def make_frames(folder, frames, size):
+    """Writes frame_0.png to frame_{frames - 1}.png like the webui sends them (RGB, no alpha)"""
+
+    os.makedirs(folder)
+    y, x = np.mgrid[0:size, 0:size]
+    for i in range(frames):
+        image = np.stack([np.sin((x + i * 3) / 17), np.cos((y - i * 2) / 11), np.sin((x + y + i) / 23)], axis=-1) * 100 + 128
+        Image.fromarray(image.astype(np.uint8)).save(f'{folder}/frame_{i}.png', compress_level=1)
+
+def seed_alpha(size, opaque):
+    """A seed's alpha channel: a disc with transparent corners, or all 255"""
+
+    if opaque:
+        return np.full((size, size), 255, np.uint8)
+    y, x = np.mgrid[0:size, 0:size]
+    return ((np.hypot(x - size / 2, y - size / 2) < size * 0.45) * 255).astype(np.uint8)
+
+def old_apply_masks(job):
+    """apply_masks before it was pooled (rewrote the frames in the output folder, which were then copied to the archive)"""
+
+    for frame in os.listdir(job.frame_path):
+        img = Image.open(f'{job.frame_path}/{frame}').convert("RGBA")
+        img_np = np.array(img)
+        img_np[..., 3] = job.alpha
+        Image.fromarray(img_np, mode="RGBA").save(f'{job.frame_path}/{frame}')
+
+def masked(fixture, folder, frames, alpha, workers, old=False):
+    """Masks a copy of the fixture (into an archive folder, like archive_output). Returns (seconds, hash of every frame)"""
+
+    job = engine.RenderJob({"prompts": ["fixture"], "timestamps": [frames - 1]}, folder) # Frames 0 to total_frames
+    shutil.copytree(fixture, job.frame_path)
+    job.alpha = alpha
+    engine.MASK_WORKERS = workers
+    start = time.perf_counter()
+    if old:
+        old_apply_masks(job)
+        shutil.copytree(job.frame_path, f'{folder}/archive')
+    else:
+        job.apply_masks(f'{folder}/archive')
+    seconds = time.perf_counter() - start
+
+    digest = hashlib.sha256()
+    for i in range(frames):
+        with open(f'{folder}/archive/frame_{i}.png', 'rb') as frame_file:
+            digest.update(frame_file.read())
+    return seconds, digest.hexdigest()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Old vs pooled alpha masks on a long video')
+    parser.add_argument('--frames', type=int, default=1000, help='frames in the synthetic video')
+    parser.add_argument('--size', type=int, default=256, help='frame width and height')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='mask processes in the pooled run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f'Writing {args.frames} {args.size}x{args.size} frames...')
+        make_frames(f'{folder}/fixture', args.frames, args.size)
+        alpha = seed_alpha(args.size, opaque=False)
+        results = {}
+        for name, workers, old in (('old', 1, True), ('1 process', 1, False), (f'{args.workers} processes', args.workers, False)):
+            seconds, digest = masked(f'{folder}/fixture', f'{folder}/{name}', args.frames, alpha, workers, old)
+            results[name] = digest
+            print(f'  {name:<12} {seconds:7.2f} s')
+        assert len(set(results.values())) == 1, 'masked frames differ depending on how they were masked'
+        print('  same frames every way')
+        seconds, _ = masked(f'{folder}/fixture', f'{folder}/opaque', args.frames, seed_alpha(args.size, opaque=True), args.workers)
+        print(f'  {"opaque seed":<12} {seconds:7.2f} s (skipped)')
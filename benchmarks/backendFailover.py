@@ -0,0 +1,74 @@
+# BACKEND FAILOVER CHECK
+# Regression check for BackendPool.map with a backend that is down: its failed requests have to be picked up by the healthy
+# backends and the map has to return, instead of every worker waiting on the dead one. Also checks that a request raising
+# something other than WebUIError (a bad response, a bug) ends the map with that error instead of hanging it. Runs against
+# the stub webui (benchmarks/stubWebui.py) and a port nothing listens on.
+# Run from the project folder: python benchmarks/backendFailover.py [--tasks 20] [--timeout 60]
+# Exits 1 if a map hangs or loses a task.
+# type: ignore
+import argparse
+import os
+import sys as pysys
+import threading
+import time
+
+pysys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from webuiClient import BackendPool
+from stubWebui import start_stub_webui
+
+DEAD_URL = 'http://127.0.0.1:1' # Nothing listens here, connections are refused straight away
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check that a dead webui backend cannot hang BackendPool.map')
+    parser.add_argument('--tasks', type=int, default=20)
+    parser.add_argument('--timeout', type=float, default=60, help='seconds the map may take before it counts as hung')
+    args = parser.parse_args()
+
+    server, url = start_stub_webui(latency=0.02)
+    pool = BackendPool([(url, 2), (DEAD_URL, 1)])
+    pool.is_ready()
+    pool.backends[1].healthy = True # As if it went down mid-render, after the last health check
+    body = b'{"width": 64, "height": 64, "prompt": "failover"}'
+    results = {}
+    lock = threading.Lock()
+
+    def on_result(task, result):
+        with lock:
+            results[task] = result
+
+    start = time.perf_counter()
+    mapper = threading.Thread(target=lambda: results.setdefault("finished", pool.map(
+        range(args.tasks), lambda client, task: client.img2img(body=body)[0], on_result)), daemon=True)
+    mapper.start()
+    mapper.join(args.timeout)
+    server.shutdown()
+
+    if mapper.is_alive():
+        print(f'FAILED: map still running after {args.timeout:.0f} s with one dead backend')
+        pysys.exit(1)
+    missing = [task for task in range(args.tasks) if task not in results]
+    if missing or not results["finished"]:
+        print(f'FAILED: map returned {results["finished"]}, tasks without a result: {missing}')
+        pysys.exit(1)
+    print(f'OK: {args.tasks} tasks with one dead backend in {time.perf_counter() - start:.2f} s')
+
+    def broken_request(client, task):
+        if task == args.tasks // 2: raise ValueError("undecodable response")
+        time.sleep(0.01)
+        return task
+
+    pool = BackendPool([(url, 2)])
+    pool.backends[0].healthy = True
+    errors = []
+    def broken_map():
+        try:
+            pool.map(range(args.tasks), broken_request, lambda task, result: None)
+        except ValueError as e:
+            errors.append(e)
+    mapper = threading.Thread(target=broken_map, daemon=True)
+    mapper.start()
+    mapper.join(args.timeout)
+    if mapper.is_alive() or not errors:
+        print(f'FAILED: map with a raising request {"still running" if mapper.is_alive() else "returned without the error"}')
+        pysys.exit(1)
+    print(f'OK: map raised "{errors[0]}" from a worker')
@@ -0,0 +1,79 @@
+# FRAME CHAIN BENCHMARK
+# Compares the client-side work between two chained frames: the old PNG round-trip (save response, read it back, re-encode,
+# json.dumps with the seed in it twice) against the in-memory frame chain (splice the response straight into the next request).
+# Run from the project folder: python benchmarks/frameChain.py [--frames 50]
+# type: ignore
+import argparse
+import base64
+import json
+import os
+import sys as pysys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+pysys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import renderEngine as engine
+
+def fake_response(width, height):
+    """Makes a base64 PNG about as compressible as a generated frame (smooth shapes plus grain)"""
+
+    y, x = np.mgrid[0:height, 0:width]
+    image = np.stack([np.sin(x / 37) * 100 + 128, np.cos(y / 23) * 100 + 128, np.sin((x + y) / 51) * 100 + 128], axis=-1)
+    image += np.random.default_rng(0).normal(0, 12, image.shape)
+    buffered = BytesIO()
+    Image.fromarray(np.clip(image, 0, 255).astype(np.uint8)).save(buffered, format="PNG")
+    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+def old_round_trip(job, image_base64, frame_path):
+    """What generate_image() used to do between two frames"""
+
+    with open(frame_path, "wb") as image_file:
+        image_file.write(base64.b64decode(image_base64))
+    with open(frame_path, "rb") as seed_image_file:
+        seed_image_base64 = base64.b64encode(seed_image_file.read()).decode("utf-8")
+    data = job.build_payload("prompt", "style", 0.5)
+    data["init_images"][0] = seed_image_base64
+    data["alwayson_scripts"]["controlnet"]["args"][0]["image"] = seed_image_base64
+    return json.dumps(data).encode("utf-8") # What requests does with json=data
+
+def frame_chain(image_base64, pieces):
+    """Critical path with the frame chain (saving happens on the writeback thread)"""
+
+    return engine.join_payload(pieces, engine.GeneratedFrame(1, image_base64))
+
+def measure(step, frames):
+    """Returns (ms per frame, peak MB allocated by one frame)"""
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        step()
+    ms = (time.perf_counter() - start) * 1000 / frames
+
+    tracemalloc.start()
+    step()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return ms, peak / 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='PNG round-trip vs in-memory frame chain')
+    parser.add_argument('--frames', type=int, default=50, help='frames timed per mode')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        for size in (640, 1024):
+            job = engine.RenderJob({"prompts": ["prompt"], "timestamps": [1], "resolution_x": size, "resolution_y": size}, folder)
+            image_base64 = fake_response(size, size)
+            pieces = engine.encode_payload(job.build_payload("prompt", "style", 0.5))
+            assert old_round_trip(job, image_base64, f"{folder}/frame.png") == frame_chain(image_base64, pieces) # Same request either way
+
+            print(f"{size}x{size} (response {len(image_base64) / 1e6:.2f} MB base64)")
+            for name, step in [("PNG round-trip", lambda: old_round_trip(job, image_base64, f"{folder}/frame.png")),
+                               ("frame chain", lambda: frame_chain(image_base64, pieces))]:
+                ms, peak = measure(step, args.frames)
+                print(f"  {name:<16} {ms:8.3f} ms/frame   peak {peak:6.2f} MB allocated")
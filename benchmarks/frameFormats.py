@@ -0,0 +1,59 @@
+# FRAME FORMAT BENCHMARK
+# How long one frame takes to save and load, and how much disk it takes, for each way a frame could be kept: PNG at
+# different zlib levels (ARCHIVE_COMPRESSION) and raw NumPy arrays.
+# Frames are smooth and noisy like generated ones, so PNG doesn't compress them unrealistically well.
+# Run from the project folder: python benchmarks/frameFormats.py [--frames 50] [--size 640]
+# type: ignore
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+def make_frame(i, size):
+    """A generated-looking RGB frame: drifting shapes with fine grain"""
+
+    y, x = np.mgrid[0:size, 0:size]
+    image = np.stack([np.sin((x + i * 3) / 17), np.cos((y - i * 2) / 11), np.sin((x + y + i) / 23)], axis=-1) * 100 + 128
+    image += np.random.default_rng(i).normal(0, 4, image.shape)
+    return Image.fromarray(np.clip(image, 0, 255).astype(np.uint8))
+
+def save_png(level):
+    return lambda frame, path: frame.save(path, compress_level=level)
+
+def load_png(path):
+    with Image.open(path) as frame:
+        frame.load()
+
+def save_npy(frame, path):
+    np.save(path, np.asarray(frame))
+
+def load_npy(path):
+    np.load(path)
+
+FORMATS = [(f'PNG level {level}', 'png', save_png(level), load_png) for level in (0, 1, 3, 6, 9)]
+FORMATS.append(('raw .npy', 'npy', save_npy, load_npy))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Save/load time and disk use of frame formats')
+    parser.add_argument('--frames', type=int, default=50, help='frames saved and loaded per format')
+    parser.add_argument('--size', type=int, default=640, help='frame width and height')
+    args = parser.parse_args()
+
+    frames = [make_frame(i, args.size) for i in range(args.frames)]
+    print(f'{args.frames} {args.size}x{args.size} frames, per frame:')
+    with tempfile.TemporaryDirectory() as folder:
+        for name, extension, save, load in FORMATS:
+            paths = [f'{folder}/{extension}-{name[-1]}-{i}.{extension}' for i in range(args.frames)]
+            start = time.perf_counter()
+            for frame, path in zip(frames, paths):
+                save(frame, path)
+            saved = time.perf_counter()
+            for path in paths:
+                load(path)
+            loaded = time.perf_counter()
+            size = sum(os.path.getsize(path) for path in paths) / args.frames
+            print(f'  {name:<12} save {(saved - start) * 1000 / args.frames:6.1f} ms   '
+                  f'load {(loaded - saved) * 1000 / args.frames:5.1f} ms   {size / 1e3:7.0f} KB')
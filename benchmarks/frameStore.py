@@ -0,0 +1,74 @@
+# FRAME STORE BENCHMARK
+# After rendering every frame is read twice, once by the encoders and once to be masked into the archive. This times both
+# passes reading PNGs (a directory listing sorted by frame number, then decoding each one) against reading slots of the
+# memory-mapped frame store (each frame decoded once, when it's stored), and checks both see the same pixels.
+# Run from the project folder: python benchmarks/frameStore.py [--frames 500] [--size 640]
+# type: ignore
+import argparse
+import os
+import sys as pysys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+pysys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import renderEngine as engine
+from frameStore import FrameStore
+
+def make_frames(folder, frames, size):
+    """Writes frame_0.png to frame_{frames - 1}.png, generated-looking frames"""
+
+    os.makedirs(folder)
+    y, x = np.mgrid[0:size, 0:size]
+    for i in range(frames):
+        image = np.stack([np.sin((x + i * 3) / 17), np.cos((y - i * 2) / 11), np.sin((x + y + i) / 23)], axis=-1) * 100 + 128
+        image += np.random.default_rng(i).normal(0, 4, image.shape)
+        Image.fromarray(np.clip(image, 0, 255).astype(np.uint8)).save(f'{folder}/frame_{i}.png', compress_level=1)
+
+def png_pass(folder):
+    """Reads every frame the way output() used to. Returns the sum of every pixel (so nothing is skipped)"""
+
+    images = [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.png')]
+    images.sort(key=engine.numerical_sort)
+    total = 0
+    for image in images:
+        with Image.open(image) as frame:
+            total += int(np.asarray(frame.convert('RGB'), dtype=np.uint32).sum())
+    return total
+
+def store_pass(store, frames):
+    total = 0
+    for i in range(frames):
+        total += int(store.get(i).sum(dtype=np.uint64))
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Reading frames from PNGs vs the memory-mapped frame store')
+    parser.add_argument('--frames', type=int, default=500, help='frames in the synthetic video')
+    parser.add_argument('--size', type=int, default=640, help='frame width and height')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f'Writing {args.frames} {args.size}x{args.size} frames...')
+        make_frames(f'{folder}/frames', args.frames, args.size)
+
+        start = time.perf_counter()
+        png_totals = [png_pass(f'{folder}/frames') for _ in range(2)]
+        png_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store = FrameStore(f'{folder}/frames.raw', args.frames, args.size, args.size)
+        for i in range(args.frames): # What write_frames and the interpolation workers do as frames come in
+            with Image.open(f'{folder}/frames/frame_{i}.png') as frame:
+                store.put(i, frame)
+        filled = time.perf_counter()
+        store_totals = [store_pass(store, args.frames) for _ in range(2)]
+        store_seconds = time.perf_counter() - filled
+        store.close()
+
+        assert png_totals[0] == store_totals[0], 'frame store has different pixels to the PNGs'
+        print(f'  PNGs          2 passes {png_seconds:6.2f} s')
+        print(f'  frame store   filling  {filled - start:6.2f} s   2 passes {store_seconds:6.2f} s')
+        print('  same pixels both ways')
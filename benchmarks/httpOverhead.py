@@ -0,0 +1,88 @@
+# HTTP OVERHEAD BENCHMARK
+# Measures per-request client overhead against a local stub webui, with and without connection pooling.
+# Run from the project folder: python benchmarks/httpOverhead.py [--requests 500] [--payload-kb 600]
+# type: ignore
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys as pysys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+pysys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from webuiClient import WebUIClient, IMG2IMG_ENDPOINT, SD_MODELS_ENDPOINT
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers img2img and sd-models instantly so only client/network overhead is measured"""
+
+    protocol_version = 'HTTP/1.1'   # Needed for keep-alive
+    disable_nagle_algorithm = True  # Like the real server (uvicorn), otherwise delayed ACKs add 40ms to kept-alive requests
+    response_body = b''
+
+    def do_GET(self):
+        self.send_json(b'[]')
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0))) # Drain request body
+        self.send_json(self.response_body)
+
+    def send_json(self, body):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass # Keeps output readable
+
+def start_stub_server(payload_kb):
+    """Starts the stub server on a free port in a background thread and returns it"""
+
+    image = base64.b64encode(os.urandom(payload_kb * 1024)).decode('utf-8')
+    StubHandler.response_body = json.dumps({"images": [image]}).encode('utf-8')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def time_requests(send, n):
+    """Calls send() n times and returns the time of each call in milliseconds"""
+
+    times = []
+    for _ in range(n):
+        start = time.perf_counter()
+        send()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+def report(name, times):
+    times = sorted(times)
+    p95 = times[int(len(times) * 0.95) - 1]
+    print(f'{name:<28} mean {statistics.mean(times):7.3f} ms   p50 {statistics.median(times):7.3f} ms   p95 {p95:7.3f} ms')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Per-request overhead with and without connection pooling')
+    parser.add_argument('--requests', type=int, default=500, help='requests per mode')
+    parser.add_argument('--payload-kb', type=int, default=600, help='size of the fake image sent both ways (a 640x640 PNG is ~600KB)')
+    args = parser.parse_args()
+
+    server = start_stub_server(args.payload_kb)
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    data = {"init_images": [base64.b64encode(os.urandom(args.payload_kb * 1024)).decode('utf-8')]}
+    print(f'Stub webui at {url}, {args.requests} requests per mode, {args.payload_kb}KB payloads\n')
+
+    # Old behaviour: module-level requests calls, new connection every time
+    report('img2img, no pooling', time_requests(lambda: requests.post(url + IMG2IMG_ENDPOINT, json=data).json(), args.requests))
+    report('sd-models, no pooling', time_requests(lambda: requests.get(url + SD_MODELS_ENDPOINT, timeout=2), args.requests))
+
+    # New behaviour: shared keep-alive session
+    client = WebUIClient(url)
+    report('img2img, pooled', time_requests(lambda: client.img2img(data), args.requests))
+    report('sd-models, pooled', time_requests(client.is_ready, args.requests))
+    client.close()
+    server.shutdown()
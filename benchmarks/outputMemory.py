@@ -0,0 +1,83 @@
+# OUTPUT MEMORY BENCHMARK
+# Peak memory (RSS) of making the MP4 and GIF from a long synthetic video: the old output() (reads every frame into a list
+# for imageio.mimsave) against the streaming one (each frame read once and written to both files straight away).
+# Each way runs in its own process so its peak is measured on its own.
+# Run from the project folder: python benchmarks/outputMemory.py [--frames 5000] [--size 256]
+# type: ignore
+import argparse
+import os
+import resource
+import subprocess
+import sys as pysys
+import tempfile
+import time
+
+import imageio
+import numpy as np
+from PIL import Image
+
+pysys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import renderEngine as engine
+
+def make_frames(folder, frames, size):
+    """Writes frame_0.png to frame_{frames - 1}.png, a pattern drifting across the screen"""
+
+    os.makedirs(folder)
+    y, x = np.mgrid[0:size, 0:size]
+    base = (np.stack([np.sin(x / 17), np.cos(y / 11), np.sin((x + y) / 23)], axis=-1) * 100 + 128).astype(np.uint8)
+    for i in range(frames):
+        Image.fromarray(np.roll(base, i, axis=1)).save(f'{folder}/frame_{i}.png', compress_level=1)
+
+def old_output(frame_path, video_path, gif_path, fps, total_frames):
+    """output() before streaming (two listings, every frame kept in a list for the GIF)"""
+
+    images = [os.path.join(frame_path, f) for f in os.listdir(frame_path) if f.endswith('.png')]
+    images.sort(key=engine.numerical_sort)
+    writer = imageio.get_writer(video_path, fps=fps)
+    for image in images:
+        writer.append_data(imageio.imread(image))
+    writer.close()
+
+    images = [os.path.join(frame_path, f) for f in os.listdir(frame_path) if f.endswith('.png')]
+    images.sort(key=engine.numerical_sort)
+    frames = []
+    for image in images:
+        frames.append(imageio.imread(image))
+    imageio.mimsave(gif_path, frames, duration=(total_frames / fps), loop=0)
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # KB on Linux, bytes on macOS
+    return peak / (1 << 20 if pysys.platform == 'darwin' else 1 << 10)
+
+def run(mode, folder, frames):
+    """Child process: makes the video one way and prints peak RSS and time"""
+
+    start = time.perf_counter()
+    if mode == 'old':
+        old_output(f'{folder}/frames', f'{folder}/old.mp4', f'{folder}/old.gif', engine.DEFAULT_FPS, frames)
+    else:
+        job = engine.RenderJob({"prompts": ["benchmark"], "timestamps": [frames - 1]}, folder) # Frames 0 to total_frames
+        job.output()
+    print(f'{peak_rss_mb():.0f} {time.perf_counter() - start:.1f}')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Peak memory of making the MP4 and GIF, old vs streaming')
+    parser.add_argument('--frames', type=int, default=5000, help='frames in the synthetic video')
+    parser.add_argument('--size', type=int, default=256, help='frame width and height')
+    parser.add_argument('--run', choices=['old', 'streaming'], help=argparse.SUPPRESS) # Used for the child processes
+    parser.add_argument('--folder', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.run, args.folder, args.frames)
+        pysys.exit()
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f'Writing {args.frames} {args.size}x{args.size} frames...')
+        make_frames(f'{folder}/frames', args.frames, args.size)
+        print(f'Raw frames: {args.frames * args.size * args.size * 3 / 1e6:.0f} MB')
+        for mode in ('old', 'streaming'):
+            result = subprocess.run([pysys.executable, __file__, '--run', mode, '--folder', folder, '--frames', str(args.frames)],
+                                    capture_output=True, text=True, check=True)
+            peak, seconds = result.stdout.split()[-2:]
+            print(f'  {mode:<10} peak RSS {float(peak):7.0f} MB   {float(seconds):6.1f} s')
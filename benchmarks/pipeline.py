@@ -0,0 +1,144 @@
+# PIPELINE BENCHMARK
+# Renders whole videos offline, against the stub webui (benchmarks/stubWebui.py) and the stub RIFE (benchmarks/stubRife.py),
+# so client-side slowdowns show up on any Linux box without a GPU. Every size x frame count runs in its own process, going
+# through generate_images(), interpolate_frames(), output() and apply_masks() like a real job (a transparent seed so the
+# frames get masked), and reports throughput, time per stage (see StageMetrics) and peak RSS.
+# Run from the project folder: python benchmarks/pipeline.py [--sizes 256,512] [--frames 24,96] [--latency 0.02]
+# Save a run with --save base.json and compare a later one with --baseline base.json (exits 1 if a stage got slower).
+# type: ignore
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys as pysys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+pysys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import renderEngine as engine
+from webuiClient import BackendPool
+from stubWebui import start_stub_webui, StubWebuiHandler
+
+STUB_RIFE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stubRife.py')
+FPS = 12                 # Generated frames per second in every run
+REGRESSION_MIN_SECONDS = 0.05 # Stages shorter than this in the baseline are too noisy to compare
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # KB on Linux, bytes on macOS
+    return peak / (1 << 20 if pysys.platform == 'darwin' else 1 << 10)
+
+def make_seed(path, size):
+    """A seed image with transparent corners, so apply_masks has work to do"""
+
+    y, x = np.mgrid[0:size, 0:size]
+    image = np.zeros((size, size, 4), np.uint8)
+    image[..., 0], image[..., 1], image[..., 2] = x * 255 // size, y * 255 // size, 128
+    image[..., 3] = (np.hypot(x - size / 2, y - size / 2) < size * 0.45) * 255
+    Image.fromarray(image).save(path)
+
+def run(folder, url, size, frames, upscale_fps):
+    """Child process: renders one video and prints its results as JSON"""
+
+    engine.backends = BackendPool([(url, 1)])
+    engine.ARCHIVE_PATH = f'{folder}/archive'
+    engine.REUSE_FRAMES = False
+    engine.RIFE_PATH = STUB_RIFE_PATH
+    make_seed(f'{folder}/seed.png', size)
+    spec = {"resolution_x": size, "resolution_y": size, "fps": FPS, "steps": 20, "upscale": upscale_fps > FPS,
+            "upscale_fps": upscale_fps, "loop": True, "seed_image": f'{folder}/seed.png',
+            "prompts": ["benchmark", "pipeline"], "styles": ["stub", "stub"], "noise_amps": [0.5, 0.6],
+            "timestamps": [frames // 2, frames]}
+    job = engine.RenderJob(spec, f'{folder}/output')
+    job.update_debug_progress_bar = lambda: None
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull): # The engine prints every frame
+        start = time.perf_counter()
+        job.clear_output()
+        job.prepare_seed()
+        job.generating = True
+        job.generate_images()
+        generated = time.perf_counter()
+        job.finish_video()
+        finished = time.perf_counter()
+
+    print(json.dumps({"size": size, "frames": frames, "video_frames": job.total_frames + 1,
+                      "generate_seconds": generated - start, "finish_seconds": finished - generated,
+                      "seconds": finished - start, "peak_rss_mb": peak_rss_mb(), "stages": job.metrics.summary()}))
+
+def report(result):
+    print(f'{result["size"]:>5}px {result["frames"]:>5} frames -> {result["video_frames"]:>5}   '
+          f'{result["seconds"]:7.2f} s   {result["frames"] / result["generate_seconds"]:6.1f} generated frames/s   '
+          f'{result["video_frames"] / result["seconds"]:6.1f} video frames/s   peak RSS {result["peak_rss_mb"]:5.0f} MB')
+    for stage, stats in result["stages"].items():
+        print(f'      {stage:<12} {stats["count"]:6d} x   p50 {stats["p50"] * 1000:8.2f} ms   p95 {stats["p95"] * 1000:8.2f} ms   '
+              f'total {stats["total"]:7.2f} s')
+
+def compare(results, baseline, tolerance):
+    """Prints stages (and whole runs) that got more than tolerance slower than in baseline. Returns how many did"""
+
+    old = {(result["size"], result["frames"]): result for result in baseline}
+    regressions = 0
+    for result in results:
+        before = old.get((result["size"], result["frames"]))
+        if before is None: continue
+        pairs = [("total", before["seconds"], result["seconds"])]
+        pairs += [(stage, before["stages"][stage]["total"], stats["total"])
+                  for stage, stats in result["stages"].items() if stage in before["stages"]]
+        for name, then, now in pairs:
+            if then >= REGRESSION_MIN_SECONDS and now > then * (1 + tolerance):
+                print(f'  SLOWER {result["size"]}px {result["frames"]} frames {name}: {then:.2f} s -> {now:.2f} s (+{(now / then - 1) * 100:.0f}%)')
+                regressions += 1
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='End to end render benchmark against stub webui and RIFE')
+    parser.add_argument('--sizes', default='256,512', help='frame widths/heights to render at, comma separated')
+    parser.add_argument('--frames', default='24,96', help='generated frames per video, comma separated')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds the stub webui takes per frame')
+    parser.add_argument('--upscale-fps', type=int, default=24, help=f'fps after interpolation ({FPS} turns it off)')
+    parser.add_argument('--rife-startup', type=float, default=0.05, help='seconds the stub RIFE takes to start')
+    parser.add_argument('--rife-frame', type=float, default=0.0, help='seconds the stub RIFE takes per frame')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file from --save to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='how much slower than the baseline counts (0.2 = 20%%)')
+    parser.add_argument('--run', nargs=4, help=argparse.SUPPRESS) # folder size frames url, used for the child processes
+    args = parser.parse_args()
+
+    os.environ['STUB_RIFE_STARTUP'] = str(args.rife_startup)
+    os.environ['STUB_RIFE_FRAME'] = str(args.rife_frame)
+    if args.run:
+        folder, size, frames, url = args.run
+        run(folder, url, int(size), int(frames), args.upscale_fps)
+        pysys.exit()
+
+    server, url = start_stub_webui(latency=args.latency)
+    print(f'Stub webui at {url}, {args.latency * 1000:.0f} ms per frame, {FPS} -> {args.upscale_fps} fps\n')
+    results = []
+    for size in [int(size) for size in args.sizes.split(',')]:
+        for frames in [int(frames) for frames in args.frames.split(',')]:
+            requests = StubWebuiHandler.requests
+            with tempfile.TemporaryDirectory() as folder:
+                child = subprocess.run([pysys.executable, __file__, '--run', folder, str(size), str(frames), url,
+                                        '--upscale-fps', str(args.upscale_fps)], capture_output=True, text=True)
+            if child.returncode != 0:
+                print(f'{size}px {frames} frames failed:\n{child.stderr}')
+                continue
+            result = json.loads(child.stdout.strip().splitlines()[-1])
+            assert StubWebuiHandler.requests - requests == frames, 'every frame should be one request'
+            results.append(result)
+            report(result)
+    server.shutdown()
+
+    if args.save:
+        with open(args.save, 'w') as results_file:
+            json.dump(results, results_file, indent=1)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        print(f'\n{regressions} regressions against {args.baseline}' if regressions else f'\nNo regressions against {args.baseline}')
+        pysys.exit(1 if regressions else 0)
@@ -0,0 +1,87 @@
+# RIFE BATCH BENCHMARK
+# Upscales a fixture sequence with the stub RIFE (benchmarks/stubRife.py) one frame per run, all frames in one run and split
+# across a pool of workers, checks they all give the same frames and compares how long they take and how many RIFE runs.
+# (Interpolating during generation isn't timed here, it hides interpolation behind the webui instead of speeding it up.)
+# Run from the project folder: python benchmarks/rifeBatch.py [--frames 24] [--startup 0.3]
+# type: ignore
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import sys as pysys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+pysys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import renderEngine as engine
+
+STUB_RIFE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stubRife.py')
+
+def make_fixture(folder, frames, size):
+    """Writes frame_0.png to frame_{frames}.png, smooth shapes drifting a little every frame like a generated video"""
+
+    os.makedirs(folder)
+    y, x = np.mgrid[0:size, 0:size]
+    for i in range(frames + 1):
+        image = np.stack([np.sin((x + i * 3) / 17), np.cos((y - i * 2) / 11), np.sin((x + y + i) / 23)], axis=-1) * 100 + 128
+        Image.fromarray(image.astype(np.uint8)).save(f'{folder}/frame_{i}.png')
+
+def upscale(fixture, folder, frames, fps, upscale_fps, batch, workers):
+    """Interpolates a copy of the fixture like finish_video does. Returns (seconds, RIFE runs, hash of every frame)"""
+
+    job = engine.RenderJob({"prompts": ["fixture"], "timestamps": [frames], "fps": fps, "upscale_fps": upscale_fps}, folder)
+    shutil.copytree(fixture, job.frame_path)
+    job.generated_frames = frames
+
+    runs = 0
+    def counted_run(*args, **kwargs):
+        nonlocal runs
+        runs += 1
+        return run(*args, **kwargs)
+
+    engine.RIFE_BATCH = batch
+    engine.INTERPOLATION_WORKERS = workers
+    run, subprocess.run = subprocess.run, counted_run
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()): # interpolate_frames prints every pair
+            job.interpolate_frames()
+    finally:
+        subprocess.run = run
+    seconds = time.perf_counter() - start
+
+    digest = hashlib.sha256()
+    for i in range(job.total_frames + 1):
+        with open(job.frame_file(i), 'rb') as frame_file:
+            digest.update(frame_file.read())
+    return seconds, runs, digest.hexdigest()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='One RIFE run per interpolated frame vs one for the whole video')
+    parser.add_argument('--frames', type=int, default=24, help='generated frames in the fixture')
+    parser.add_argument('--size', type=int, default=256, help='fixture frame width and height')
+    parser.add_argument('--startup', type=float, default=0.3, help='seconds the stub takes to "load the model" each run')
+    parser.add_argument('--per-frame', type=float, default=0.01, help='seconds the stub takes per interpolated frame')
+    parser.add_argument('--workers', type=int, default=4, help='RIFE runs at once in the pooled mode')
+    args = parser.parse_args()
+
+    os.environ['STUB_RIFE_STARTUP'] = str(args.startup)
+    os.environ['STUB_RIFE_FRAME'] = str(args.per_frame)
+    engine.RIFE_PATH = STUB_RIFE_PATH
+    with tempfile.TemporaryDirectory() as folder:
+        make_fixture(f'{folder}/fixture', args.frames, args.size)
+        for fps, upscale_fps in ((12, 24), (12, 36), (12, 48), (12, 60)):
+            print(f'{args.frames} frames, {fps} -> {upscale_fps} fps')
+            results = {}
+            for name, batch, workers in (('per frame', False, 1), ('one run', True, 1), (f'{args.workers} workers', True, args.workers)):
+                seconds, runs, digest = upscale(f'{folder}/fixture', f'{folder}/{upscale_fps}-{name}', args.frames, fps, upscale_fps, batch, workers)
+                results[name] = digest
+                print(f'  {name:<10} {seconds:7.2f} s   {runs:4d} RIFE runs')
+            assert len(set(results.values())) == 1, 'interpolation made different frames depending on how it was run'
+            print('  same frames every way')
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# STUB RIFE
+# Stands in for rife-ncnn-vulkan in benchmarks: same command line, blends frames instead of running the model, and sleeps
+# to act like loading the model (STUB_RIFE_STARTUP seconds, once per run) and interpolating (STUB_RIFE_FRAME seconds per frame).
+#   stubRife.py -0 a.png -1 b.png -o out.png [-s 0.5]      One frame between a pair (what interpolate_frame runs)
+#   stubRife.py -i in/ -o out/ [-n count]                  Directory mode (what interpolate_sequence runs)
+# Directory mode follows rife-ncnn-vulkan: output i (saved as %08d.png counting from 1) is at time i * inputs / count of the
+# sorted input frames, and frames that land exactly on an input are copies of it. Timesteps are rounded to 6 decimals so
+# both modes blend a frame exactly the same way.
+# type: ignore
+import argparse
+import os
+import shutil
+import time
+
+from PIL import Image
+
+def blend(frame_1_path, frame_2_path, new_frame_path, timestep=0.5):
+    """Fake interpolation: mixes the two frames"""
+
+    time.sleep(float(os.environ.get('STUB_RIFE_FRAME', 0.01)))
+    frame_1 = Image.open(frame_1_path).convert('RGB')
+    frame_2 = Image.open(frame_2_path).convert('RGB')
+    Image.blend(frame_1, frame_2, timestep).save(new_frame_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Fake rife-ncnn-vulkan for benchmarks')
+    parser.add_argument('-0', dest='frame_1')
+    parser.add_argument('-1', dest='frame_2')
+    parser.add_argument('-i', dest='input_path')
+    parser.add_argument('-o', dest='output_path', required=True)
+    parser.add_argument('-n', dest='count', type=int, default=0)
+    parser.add_argument('-s', dest='timestep', type=float, default=0.5)
+    parser.add_argument('-m', dest='model') # Ignored
+    args = parser.parse_args()
+
+    time.sleep(float(os.environ.get('STUB_RIFE_STARTUP', 0.3))) # Loading the model and starting Vulkan
+    if args.input_path is None:
+        blend(args.frame_1, args.frame_2, args.output_path, round(args.timestep, 6))
+    else:
+        inputs = sorted(os.listdir(args.input_path))
+        count = args.count or len(inputs) * 2
+        for i in range(count):
+            position = i * len(inputs) / count
+            x0 = min(int(position), len(inputs) - 1)
+            x1 = min(x0 + 1, len(inputs) - 1)
+            timestep = round(position - int(position), 6)
+            output = os.path.join(args.output_path, f'{i + 1:08d}.png')
+            if timestep == 0:
+                shutil.copy(os.path.join(args.input_path, inputs[x0]), output)
+            else:
+                blend(os.path.join(args.input_path, inputs[x0]), os.path.join(args.input_path, inputs[x1]), output, timestep)
@@ -0,0 +1,101 @@
+# STUB WEBUI
+# Stands in for the Stable Diffusion webui in benchmarks, so the whole pipeline can be measured without a GPU. Answers
+# /sdapi/v1/img2img with a frame made from a hash of the request's init image, prompt, denoising strength and seed (the
+# same request always gets the same frame, and chained frames change from one to the next) after sleeping like the
+# server would, and /sdapi/v1/sd-models with the ControlNet model the program asks for.
+#   python benchmarks/stubWebui.py [--port 7860] [--latency 0.5] [--step-latency 0]
+# runs it on its own, so the window or batchRender.py --no-server can render against it. Benchmarks use start_stub_webui.
+# type: ignore
+import argparse
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+STUB_MODELS = [{"title": "control_sd15_hed [fef5e48e]", "model_name": "control_sd15_hed", "hash": "fef5e48e"}]
+
+def stub_frame(request, width, height):
+    """PNG bytes of the frame for a request: smooth shapes placed by the request's hash, with grain, so it compresses
+       about as well as a generated frame"""
+
+    key = hashlib.sha256(json.dumps([request.get("init_images", [""])[0], request.get("prompt"),
+                                     request.get("denoising_strength"), request.get("seed")]).encode()).digest()
+    rng = np.random.default_rng(int.from_bytes(key[:8], 'little'))
+    phase = rng.uniform(0, 100, 3)
+    y, x = np.mgrid[0:height, 0:width]
+    image = np.stack([np.sin((x + phase[0]) / 17), np.cos((y + phase[1]) / 11), np.sin((x + y + phase[2]) / 23)], axis=-1) * 100 + 128
+    image += rng.normal(0, 4, image.shape)
+    buffered = BytesIO()
+    Image.fromarray(np.clip(image, 0, 255).astype(np.uint8)).save(buffered, format="PNG")
+    return buffered.getvalue()
+
+class StubWebuiHandler(BaseHTTPRequestHandler):
+    """img2img and sd-models like the webui's API. latency is slept per request, step_latency per sampling step per
+       megapixel (a bigger or longer render takes longer, like on a GPU)"""
+
+    protocol_version = 'HTTP/1.1'   # Needed for keep-alive
+    disable_nagle_algorithm = True  # Like the real server (uvicorn), otherwise delayed ACKs add 40ms to kept-alive requests
+    latency = 0.0
+    step_latency = 0.0
+    requests = 0                    # img2img requests answered, for the benchmarks to check
+    lock = threading.Lock()
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/sdapi/v1/sd-models':
+            self.send_json(json.dumps(STUB_MODELS).encode('utf-8'))
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.rstrip('/') != '/sdapi/v1/img2img':
+            self.send_error(404)
+            return
+        start = time.perf_counter()
+        request = json.loads(body)
+        width, height = int(request.get("width", 512)), int(request.get("height", 512))
+        image = stub_frame(request, width, height)
+        delay = self.latency + self.step_latency * int(request.get("steps", 1)) * width * height / 1e6
+        time.sleep(max(0.0, delay - (time.perf_counter() - start))) # Making the frame counts towards the latency
+        with self.lock:
+            StubWebuiHandler.requests += 1
+        self.send_json(json.dumps({"images": [base64.b64encode(image).decode('utf-8')]}).encode('utf-8'))
+
+    def send_json(self, body):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass # No line per request
+
+def start_stub_webui(port=0, latency=0.0, step_latency=0.0):
+    """Serves the stub on a background thread. Returns (server, url), port 0 picks a free port"""
+
+    StubWebuiHandler.latency = latency
+    StubWebuiHandler.step_latency = step_latency
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubWebuiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Fake Stable Diffusion webui API for benchmarks')
+    parser.add_argument('--port', type=int, default=7860)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds per img2img request')
+    parser.add_argument('--step-latency', type=float, default=0.0, help='extra seconds per sampling step per megapixel')
+    args = parser.parse_args()
+
+    server, url = start_stub_webui(args.port, args.latency, args.step_latency)
+    print(f'Stub webui at {url} (Ctrl+C to stop)')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
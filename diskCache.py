@@ -0,0 +1,79 @@
+# DISK CACHE
+# Size bounded folder of cached files, where the least recently used entries are removed first. Uses are recorded as file
+# modification times, so the order survives restarts. ResponseCache (generated frames) and PreviewCache (archive
+# thumbnails and preview clips) are built on it and only say what an entry is and where its files go.
+# type: ignore
+import os
+import threading
+from collections import OrderedDict
+
+class DiskCache:
+    """Entries of one or more files in folder, kept under max_bytes by removing the least recently used entry's files.
+       Subclasses give the paths of an entry's files (the first one's modification time is its last use) and the keys
+       of the entries in the folder. Shared by many threads, so everything that touches entries holds the lock."""
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.entries = None # key -> bytes of its files, least recently used first (read from disk the first time it's needed)
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def paths(self, key):
+        """Paths of key's files, the one that records its last use first"""
+
+        raise NotImplementedError
+
+    def stored_keys(self):
+        """Keys of the entries found in folder (ones with files missing are skipped by load)"""
+
+        raise NotImplementedError
+
+    def load(self):
+        """Lists what is already in the cache, oldest use first. Call with the lock held"""
+
+        found = []
+        for key in self.stored_keys():
+            try:
+                stats = [os.stat(path) for path in self.paths(key)]
+            except OSError: # Incomplete, or removed while listing
+                continue
+            found.append((stats[0].st_mtime, key, sum(stat.st_size for stat in stats)))
+        found.sort()
+        self.entries = OrderedDict((key, size) for _, key, size in found)
+        self.size = sum(self.entries.values())
+
+    def touch(self, key):
+        """Marks key as just used. Returns False if it isn't cached (or its files were removed by hand). Call with the lock held"""
+
+        if self.entries is None: self.load()
+        if key not in self.entries: return False
+        try:
+            os.utime(self.paths(key)[0]) # Most recently used, also for the next time the cache is loaded
+        except OSError:
+            self.forget(key)
+            return False
+        self.entries.move_to_end(key)
+        return True
+
+    def forget(self, key):
+        """Drops key from the entries without removing files. Call with the lock held"""
+
+        self.size -= self.entries.pop(key, 0)
+
+    def added(self, key, size):
+        """Records that key's files (size bytes) were just written, then removes the least recently used entries until the
+           cache fits max_bytes (the newest always stays). Call with the lock held"""
+
+        if self.entries is None: self.load()
+        self.forget(key)
+        self.entries[key] = size
+        self.size += size
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            old_key, old_size = self.entries.popitem(last=False)
+            self.size -= old_size
+            for path in self.paths(old_key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
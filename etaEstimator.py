@@ -0,0 +1,73 @@
+# ETA ESTIMATOR
+# How long a job will take, learned from the stage times of past jobs (metrics.jsonl in each archive folder, see
+# StageMetrics). Each stage's runs are fitted as seconds = fixed + per_unit * work, where work is what the run had to do
+# (megapixels, sampling steps times denoising strength for the server...), so a job at another resolution or with other
+# settings is still predicted. While a job renders, an exponentially weighted moving average of how long frames really
+# take against the prediction keeps the ETA honest.
+# type: ignore
+import numpy as np
+
+ETA_HISTORY_JOBS = 50  # Newest archived jobs learned from
+ETA_SMOOTHING = 0.2    # Weight of the newest frame in the moving average (higher reacts faster, lower is steadier)
+
+class StageCosts:
+    """Fitted cost of every stage seen in past jobs, and how long a frame really took against its predicted server time
+       (the other per frame stages run on other threads, mostly while the next frame is on the server)"""
+
+    def __init__(self):
+        self.samples = {}      # stage -> [(work, seconds)] of single runs
+        self.fits = {}         # stage -> (fixed seconds per run, seconds per unit of work)
+        self.frame_ratios = [] # Per past frame: seconds since the frame before it was saved / predicted server time
+        self.jobs = 0          # Jobs learned from
+
+    def add(self, stage, work, seconds):
+        self.samples.setdefault(stage, []).append((work, seconds))
+
+    def fit(self):
+        """Least squares fit of every stage's runs (neither part can go negative)"""
+
+        for stage, samples in self.samples.items():
+            work, seconds = np.array(samples, dtype=float).T
+            if len(samples) > 1 and work.std() > 0:
+                per_unit, fixed = np.linalg.lstsq(np.stack([work, np.ones_like(work)], axis=1), seconds, rcond=None)[0]
+                if per_unit >= 0 and fixed >= 0:
+                    self.fits[stage] = (float(fixed), float(per_unit))
+                    continue
+            if work.sum() > 0: # All runs had the same work (or the fit went negative), cost is proportional to it
+                self.fits[stage] = (0.0, float(seconds.sum() / work.sum()))
+            else:
+                self.fits[stage] = (float(seconds.mean()), 0.0)
+
+    def predict(self, stage, runs, work):
+        """Seconds runs runs of stage take, with work units in total. None if the stage was never measured"""
+
+        if stage not in self.fits: return None
+        fixed, per_unit = self.fits[stage]
+        return fixed * runs + per_unit * work
+
+    def frame_ratio(self):
+        """Median seconds a frame took per second of predicted server time, None without history"""
+
+        return float(np.median(self.frame_ratios)) if self.frame_ratios else None
+
+class LiveEstimate:
+    """Moving average of actual seconds per predicted second, updated as frames finish"""
+
+    def __init__(self, ratio=None, smoothing=ETA_SMOOTHING):
+        self.ratio = ratio
+        self.smoothing = smoothing
+
+    def update(self, seconds, predicted):
+        if predicted <= 0: return
+        ratio = seconds / predicted
+        self.ratio = ratio if self.ratio is None else self.smoothing * ratio + (1 - self.smoothing) * self.ratio
+
+def format_duration(seconds):
+    """Readable text for a number of seconds, like "1 hrs, 2 mins, 3 secs." """
+
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600} hrs, {seconds // 60 % 60} mins, {seconds % 60} secs."
+    if seconds >= 60:
+        return f"{seconds // 60} mins, {seconds % 60} secs."
+    return f"{seconds} secs."
@@ -0,0 +1,58 @@
+# FRAME SCHEDULE
+# What every generated frame of a video is made with (pivot, denoise strength, sampler seed and the image it starts from),
+# worked out for the whole timeline at once as NumPy arrays. Generation just reads its frame's row, and the plan can be
+# looked at, or its cost estimated, before anything is sent to the server (see batchRender.py --plan).
+# type: ignore
+import numpy as np
+
+NOISESHIFT_C = 0.1      #
+NOISESHIFT_K = 0.2      # Constants for noiseshift equation
+NOISESHIFT_H = -1       #
+NOISESHIFT_E = 2.71828  #
+
+def noise_shift(x, noise_amps, minimum_strength):
+    """Denoising strengths of frames x (0 is the first frame of its pivot) of pivots with noise_amps (arrays, one per frame)
+       FORMULA FOR DENOISING STRENGTH: N(x, n) = n - [(n - 0.1) * e^(-0.2[x - 0.5])] where n is pivot's denoise strength, x is current frame of THAT pivot, and N is denoising strength.
+       The e^ part only depends on x, so it's worked out once per frame of the longest pivot with Python's pow (NumPy's
+       can be a bit off in the last digit, which would change every request and miss the response cache)."""
+
+    if len(x) == 0:
+        return np.zeros(0)
+    decay = np.array([pow(NOISESHIFT_E, -NOISESHIFT_K * (i - NOISESHIFT_H)) for i in range(int(x.max()) + 1)])
+    strength = noise_amps - (noise_amps - NOISESHIFT_C) * decay[x]
+    return np.maximum(strength, minimum_strength)
+
+class FrameSchedule:
+    """Per frame plan of a video's frames 1 to frames, as arrays indexed by frame - 1:
+       timeline       frame of the pivot timeline it is (frame * stride, drafts skip frames)
+       pivot          pivot whose prompt, style and noise amplitude it uses
+       strength       denoising strength
+       sampler_seed   webui sampler seed, -1 for random
+       init_frame     frame it's generated from, 0 is the seed image (every frame when chaining is off)"""
+
+    def __init__(self, timestamps, noise_amps, minimum_strength, frames, stride=1, chained=True, sampler_seed=-1):
+        self.frames = frames
+        frame = np.arange(1, frames + 1)
+        self.timeline = np.minimum(frame * stride, timestamps[-1])
+        self.pivot = np.minimum(np.searchsorted(timestamps, self.timeline), len(timestamps) - 1) # First pivot ending at or after it
+        pivot_start = np.array([0] + list(timestamps[:-1]))[self.pivot]
+        self.strength = noise_shift(self.timeline - 1 - pivot_start, np.array(noise_amps, dtype=float)[self.pivot], minimum_strength)
+        self.sampler_seed = self.timeline + sampler_seed if sampler_seed >= 0 else np.full(frames, -1)
+        self.init_frame = frame - 1 if chained else np.zeros(frames, dtype=int)
+
+    def row(self, frame_num):
+        """(pivot, strength, sampler seed) of frame_num as plain Python numbers"""
+
+        i = frame_num - 1
+        return int(self.pivot[i]), float(self.strength[i]), int(self.sampler_seed[i])
+
+    def pivot_at(self, frame_num):
+        """Pivot of frame_num, the last frame's if it's past the end (a finished job's next frame)"""
+
+        if self.frames == 0: return 0
+        return int(self.pivot[min(max(frame_num, 1), self.frames) - 1])
+
+    def pivot_frames(self, pivot):
+        """Frame numbers of pivot"""
+
+        return np.flatnonzero(self.pivot == pivot) + 1
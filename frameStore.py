@@ -0,0 +1,49 @@
+# FRAME STORE
+# A video's decoded frames in one memory-mapped file, a fixed size slot per frame numbered by its place in the final video,
+# so the encoders and masks read pixels straight from the page cache by index instead of finding and decoding PNGs again
+# type: ignore
+import os
+
+import numpy as np
+
+class FrameStore:
+    """Preallocated (frames x height x width x 3) uint8 array on disk. Slots are filled as frames are made, any slot that
+       wasn't (frames from before a resume, a frame of the wrong size) is read from its PNG by whoever needs it instead."""
+
+    def __init__(self, path, frames, width, height):
+        self.path = path
+        self.shape = (frames, height, width, 3)
+        with open(path, 'wb') as store_file:
+            if hasattr(os, 'posix_fallocate'): # Claims the disk space now, running out mid-write would crash the program (SIGBUS)
+                os.posix_fallocate(store_file.fileno(), 0, int(np.prod(self.shape)))
+            else:
+                store_file.truncate(int(np.prod(self.shape)))
+        self.slots = np.memmap(path, dtype=np.uint8, mode='r+', shape=self.shape)
+        self.filled = np.zeros(frames, dtype=bool)
+
+    def put(self, index, image):
+        """Copies a PIL image into slot index. Returns False if it doesn't fit (out of range or not the store's size)"""
+
+        if not 0 <= index < self.shape[0] or image.size != (self.shape[2], self.shape[1]):
+            return False
+        self.slots[index] = np.asarray(image.convert('RGB'))
+        self.filled[index] = True
+        return True
+
+    def get(self, index):
+        """Slot index as an array backed by the file (no copy), or None if it was never filled"""
+
+        if 0 <= index < self.shape[0] and self.filled[index]:
+            return self.slots[index]
+        return None
+
+    def close(self):
+        """Unmaps the store and deletes its file"""
+
+        del self.slots
+        os.remove(self.path)
+
+def open_slots(path, shape):
+    """Read-only view of a store's slots from another process (see FrameStore.path and shape)"""
+
+    return np.memmap(path, dtype=np.uint8, mode='r', shape=shape)
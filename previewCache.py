@@ -0,0 +1,84 @@
+# PREVIEW CACHE
+# Small versions of archived videos for the window: a thumbnail and a low resolution preview clip (GIF) per job, made once
+# (when the job is archived, or the first time the gallery shows a job archived before previews existed) and kept in a size
+# bounded folder inside the archive. The gallery and the display panel show these instead of decoding full size frames.
+# type: ignore
+import os
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from diskCache import DiskCache
+from videoEncoders import GifWriter
+
+PREVIEW_FOLDER_NAME = '.previews'   # Folder in the archive the previews are kept in
+PREVIEW_CACHE_SIZE = 256 * 1024 ** 2 # Bytes the previews can take up before the least recently shown jobs' are removed
+THUMBNAIL_SIZE = 256                # Thumbnails fit in a square this many pixels wide
+PREVIEW_CLIP_SIZE = 384             # Preview clips fit in a square this many pixels wide
+PREVIEW_CLIP_FRAMES = 96            # Most frames in a preview clip, longer videos skip frames (and the clip's fps drops to match)
+
+def fit(image, size):
+    """RGB PIL image of image (PIL image or array) scaled down to fit in a size x size square"""
+
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(np.asarray(image))
+    image = image.convert('RGB')
+    scale = min(1, size / image.width, size / image.height)
+    return image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.BILINEAR)
+
+class PreviewCache(DiskCache):
+    """<job>.png thumbnail and <job>.gif preview clip of archived jobs in folder (job is the archive folder's name), kept
+       under max_bytes by removing the least recently used job's. Shared by the render threads and the gallery, so it's
+       thread safe."""
+
+    def __init__(self, folder, max_bytes=PREVIEW_CACHE_SIZE):
+        super().__init__(folder, max_bytes)
+
+    def paths(self, job):
+        """(thumbnail path, preview clip path) of job. Uses are recorded on the thumbnail"""
+
+        return os.path.join(self.folder, job + '.png'), os.path.join(self.folder, job + '.gif')
+
+    def stored_keys(self):
+        if not os.path.isdir(self.folder): return []
+        return [name[:-4] for name in os.listdir(self.folder) if name.endswith('.png')]
+
+    def get(self, job):
+        """(thumbnail path, preview clip path) of job if its previews were made, or None"""
+
+        with self.lock:
+            return self.paths(job) if self.touch(job) else None
+
+    def put(self, job, read_frame, frames, fps):
+        """Makes job's previews from its frames 0 to frames - 1 (read_frame(i) returns frame i as a PIL image or RGB array)
+           of a video at fps, then removes the least recently used previews until the cache fits max_bytes. Only the frames
+           in the clip are read. Returns (thumbnail path, preview clip path)."""
+
+        step = max(1, -(-frames // PREVIEW_CLIP_FRAMES)) # Rounds up
+        os.makedirs(self.folder, exist_ok=True)
+        thumbnail_path, clip_path = self.paths(job)
+        clip = GifWriter(clip_path + '.tmp', fps / step) # The clip lasts as long as the video
+        thumbnail = None
+        try:
+            for i in range(0, frames, step):
+                image = fit(read_frame(i), PREVIEW_CLIP_SIZE)
+                clip.append(image)
+                if thumbnail is None and i >= frames // 2: # Middle of the video, the first frame is only the seed image
+                    thumbnail = fit(image, THUMBNAIL_SIZE)
+        finally:
+            clip.close()
+        if thumbnail is None:
+            os.remove(clip_path + '.tmp')
+            raise ValueError(f"No frames to preview {job} with.")
+        buffered = BytesIO()
+        thumbnail.save(buffered, format="PNG")
+
+        with self.lock:
+            if self.entries is None: self.load()
+            os.replace(clip_path + '.tmp', clip_path)
+            with open(thumbnail_path + '.tmp', 'wb') as thumbnail_file:
+                thumbnail_file.write(buffered.getvalue())
+            os.replace(thumbnail_path + '.tmp', thumbnail_path) # Written last, a crash can't leave a thumbnail without its clip
+            self.added(job, len(buffered.getvalue()) + os.path.getsize(clip_path))
+        return thumbnail_path, clip_path
@@ -0,0 +1,1505 @@
+# RENDER ENGINE
+# Everything that makes a video (server, frame generation, interpolation, output) without any window code, so it can run
+# headless. Used by videoGenerator.py (the window) and batchRender.py (job files from the command line).
+# type: ignore
+from PIL import Image
+import threading
+import queue
+import os
+import subprocess
+import base64
+import json
+import hashlib
+from datetime import datetime
+import time
+import psutil
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+import re
+import random
+from io import BytesIO
+from webuiClient import BackendPool, WebUIError
+from videoEncoders import GifWriter, Mp4Writer
+from frameStore import FrameStore, open_slots
+from responseCache import ResponseCache
+from frameSchedule import FrameSchedule
+from stageMetrics import StageMetrics
+from etaEstimator import StageCosts, LiveEstimate, format_duration, ETA_HISTORY_JOBS
+from renderEvents import EventBus, RenderEvent
+from previewCache import PreviewCache, PREVIEW_FOLDER_NAME
+
+# Persistent Parameters
+# File paths (for the window's job, batch jobs get their own output folder with the same layout):
+OUTPUT_PATH = 'output'                                 # Folder the current video is made in
+OUTPUT_VIDEO_PATH = f'{OUTPUT_PATH}/output_video.mp4'  # Where to save output video
+OUTPUT_GIF_PATH = f'{OUTPUT_PATH}/output_video.gif'    # output gif
+ARCHIVE_PATH = 'output-archive'                        # Folder with all previous output videos/gifs
+FRAME_PATH = f'{OUTPUT_PATH}/frames'                   # Folder where frames are added
+SEED_INPUT_PATH = f'{OUTPUT_PATH}/seed_frame.png'      # Previously used seed image (not resized) (default seed path)
+RESIZED_SEED_PATH = f'{FRAME_PATH}/frame_0.png'        # Frame 0 of output (seed image gets resized here)
+JOURNAL_NAME = 'journal.jsonl'                         # Record of a job's finished frames, kept in its output folder (see RenderJob.resume)
+FRAME_STORE_NAME = 'frames.raw'                        # Decoded frames while a job renders, in its output folder (see FrameStore)
+METRICS_NAME = 'metrics.jsonl'                         # Time every stage of a job took, in its output folder (see StageMetrics)
+METRICS_SUMMARY_NAME = 'metrics.prom'                  # p50/p95 of every stage, written to the archive in Prometheus' format
+PREVIOUS_NAME = 'previous'                             # Where the last job's frames wait while a new job looks for ones to reuse
+REUSE_FRAMES = True # Start a job with a pinned sampler seed with the frames a previous one (last in the output folder, or archived)
+                    # made from the same requests. Jobs with a random seed always get new frames (a new take)
+RIFE_PATH = 'bin/RIFE-NCNN_Interpolation/rife-ncnn-vulkan' # Frame interpolation software (C++ library)
+RIFE_MODEL_PATH = 'bin/RIFE-NCNN_Interpolation/rife-v4.6' # RIFE model (v4 models can interpolate at any timestep, not only halfway)
+RIFE_BATCH = True # Interpolate many frames per RIFE run (directory mode) so the model loads less often, False runs RIFE per frame
+INTERPOLATION_WORKERS = 2 # RIFE runs going at the same time (each works on its own frame pairs)
+INTERPOLATION_CHUNK = 8   # Frame pairs per RIFE run while frames are still generating
+STREAM_INTERPOLATION = True # Interpolate finished frames while later ones generate (False waits for generation to finish,
+                            # which can be faster if RIFE and the webui share one GPU)
+INCREMENTAL_OUTPUT = True   # Add frames to the MP4 and GIF as they are made, so the video can be watched mid-run and only
+                            # needs closing at the end (False encodes everything once the video is finished)
+ARCHIVE_COMPRESSION = 6             # zlib level (0-9) of frames written to the archive, where they're kept. Frames in the output
+                                    # folder are the webui's and RIFE's PNGs as they come (see benchmarks/frameFormats.py)
+FRAME_STORE = True                  # Keep decoded frames in a memory-mapped file so encoding and masking don't decode PNGs again
+                                    # (takes width x height x 3 bytes of disk per frame of the final video until it's archived)
+MASK_WORKERS = os.cpu_count() or 1 # Processes rewriting frames with the alpha mask (decoding and encoding PNGs is CPU bound)
+MASK_CHUNK = 64                     # Frames each mask process does per task
+RESPONSE_CACHE_PATH = 'output-cache'  # Generated frames by request, so re-rendering a job with a pinned sampler seed skips the server
+RESPONSE_CACHE_SIZE = 2 * 1024 ** 3   # Bytes the cache can take up before the least recently used frames are removed
+WEBUI_URL = 'http://127.0.0.1:7860'                    # Where the Stable Diffusion webui API is served
+
+# Webui servers to generate on as (url, how many requests it can work on at once). The first one is started by this program,
+# add more (other ports/machines already running webui with --api) to render frames in parallel when seed incrementing is off
+WEBUI_BACKENDS = [(WEBUI_URL, 1)]
+
+# Video Generation:
+DEFAULT_DENOISING_STRENGTH = 0.5    # Default denoising strength for image generation
+DEFAULT_FPS = 12                    # Default frames per second for video generation
+DEFAULT_STEPS = 30                  # Default number of steps
+DEFAULT_CFG_SCALE = 25              # Configuration scale (how much model follows prompt)
+DEFAULT_RESOLUTION = [640, 640]     # Default resolution for generated images
+DEFAULT_DURATION = 24               # Default frames between pivots
+DEFAULT_UPSCALED_FPS = 60           # Upscaled FPS
+DEFAULT_MINIMUM_DENOISE_STRENGTH = 0.35 # Prevents denoising strength from getting lower than this value
+DEFAULT_SAMPLER_SEED = -1           # Webui sampler seed, -1 is random. Pinning it makes frames repeatable (and cacheable)
+DRAFT_SCALE = 0.5                   # Draft previews render at this fraction of the resolution (see draft_spec)
+DRAFT_STEPS = 10                    # and with this many sampling steps
+DRAFT_STRIDE = 1                    # Draft previews render every Nth frame of the timeline (1 renders all of them)
+SEED_PLACEHOLDER = "__SEED_IMAGE__" # Stands in for the seed image in serialized requests until it is spliced in
+PREFETCH_DEPTH = 2                  # Requests prepared ahead of the one on the server
+WRITEBACK_DEPTH = 4                 # Generated frames that can wait to be saved before generation waits for the disk
+PROMPT_WEIGHT = 0.6                 # Amount that ControlNet favors consisteny over prompt (lower value -> more prompt weight)
+
+# Miscellaneous
+PROGRESS_BAR_LENGTH = 60 # Number of characters in progress bar
+# Denoise curve constants are in frameSchedule.py
+
+# Variables
+server_process = None # Tracks the webui server started by start_local_server
+backends = BackendPool(WEBUI_BACKENDS) # Pooled keep-alive connections shared by every request (and every job) to the server(s)
+response_cache = ResponseCache(RESPONSE_CACHE_PATH, RESPONSE_CACHE_SIZE) # Shared by every job too
+preview_caches = {} # Archive folder -> PreviewCache of the thumbnails and preview clips in it (see preview_cache)
+
+# RENDER JOBS
+class RenderJob:
+    """One video: its parameters, its progress and its own output folder. Everything generation used to keep in module
+       globals lives here, so one process (the window, or batchRender.py) can run many jobs one after another, or at the
+       same time, without restarting Python or the webui server."""
+
+    def __init__(self, spec, output_dir=OUTPUT_PATH):
+        """spec has the same fields VideoGeneratorUI.collect_inputs() returns (timestamps are cumulative frame counts, one
+           per pivot), plus an optional 'seed_image' path. Missing fields fall back to the defaults."""
+
+        self.spec = dict(spec)
+
+        # Image Generation
+        self.prompts = list(spec["prompts"])                            # List of prompts for image generation
+        self.timestamps = [int(timestamp) for timestamp in spec["timestamps"]] # Cumulative frame where each pivot ends
+        self.styles = list(spec.get("styles", [""] * len(self.prompts)))  # List of styles corresponding to each prompt
+        self.noise_amps = list(spec.get("noise_amps", [DEFAULT_DENOISING_STRENGTH] * len(self.prompts))) # Noise amplitude for each prompt
+        if not self.prompts or not len(self.prompts) == len(self.styles) == len(self.noise_amps) == len(self.timestamps):
+            raise ValueError("Job needs at least one pivot, and the same number of prompts, styles, noise_amps and timestamps.")
+        if self.timestamps != sorted(self.timestamps):
+            raise ValueError("Job timestamps must be cumulative (each pivot ends after the previous one).")
+
+        self.resolution_x = int(spec.get("resolution_x", DEFAULT_RESOLUTION[0]))  # Width of the generated images
+        self.resolution_y = int(spec.get("resolution_y", DEFAULT_RESOLUTION[1]))  # Height of the generated images
+        self.fps = spec.get("fps", DEFAULT_FPS)                        # Frames per second for the video
+        self.steps = spec.get("steps", DEFAULT_STEPS)                  # Sampling steps per frame
+        self.cfg_scale = spec.get("cfg_scale", DEFAULT_CFG_SCALE)      # Importance of prompt
+        self.minimum_denoise_strength = spec.get("minimum_denoise_strength", DEFAULT_MINIMUM_DENOISE_STRENGTH)
+        self.use_original_seed = spec.get("use_original_seed", False)  # Every frame uses the seed image instead of previous frame
+        self.sampler_seed = int(spec.get("sampler_seed", DEFAULT_SAMPLER_SEED)) # Frame n uses sampler_seed + n, -1 leaves it random
+        self.upscale = spec.get("upscale", True)                       # Interpolate frames flag (increases fps)
+        self.upscale_fps = upscaled_fps(self.fps, spec.get("upscale_fps", DEFAULT_UPSCALED_FPS)) # FPS after interpolation (a whole multiple of fps)
+        self.frame_multiplier = max(1, round(self.upscale_fps / self.fps)) # Frames in the upscaled video per generated frame
+        self.video_multiplier = self.frame_multiplier if self.upscale and self.fps < self.upscale_fps else 1 # Same for the final video
+        self.loop = spec.get("loop", True) # Adds the seed image as the last frame and interpolates to it, creating a subtle loop effect
+        self.frame_stride = max(1, int(spec.get("frame_stride", 1))) # Generated frame n is frame n * frame_stride of the timeline (drafts)
+        self.draft_of = spec.get("draft_of") # Spec of the full quality video if this is a draft of it (see draft_spec)
+
+        # File paths
+        self.output_dir = output_dir
+        self.frame_path = f'{output_dir}/frames'
+        self.video_path = f'{output_dir}/output_video.mp4'
+        self.gif_path = f'{output_dir}/output_video.gif'
+        self.seed_input_path = f'{output_dir}/seed_frame.png'
+        self.resized_seed_path = f'{self.frame_path}/frame_0.png'
+        self.parameters_path = f'{output_dir}/parameters.txt'
+        self.journal_path = f'{output_dir}/{JOURNAL_NAME}'
+        self.frame_store_path = f'{output_dir}/{FRAME_STORE_NAME}'
+        self.previous_path = f'{output_dir}/{PREVIOUS_NAME}'
+        self.metrics = StageMetrics(f'{output_dir}/{METRICS_NAME}') # Times of every stage (request building, server, saving...)
+        self.journal_lock = threading.Lock()
+        self.interpolated_path = f'{output_dir}/interpolated' # Interpolated frames, named by their number in the upscaled video
+
+        # Progress
+        self.pivot_num = 0              # Current pivot of the prompt being processed
+        self.generated_frames = 0       # How many frames have been generated
+        self.total_frames = -(-self.timestamps[-1] // self.frame_stride) # Total number of frames to generate
+        # Pivot, denoise strength and sampler seed of every frame, worked out once (see FrameSchedule)
+        self.schedule = FrameSchedule(self.timestamps, self.noise_amps, self.minimum_denoise_strength, self.total_frames,
+                                      self.frame_stride, not self.use_original_seed, self.sampler_seed)
+        self.denoising_strength = 0     # Denoising strength of the latest frame
+        self.ETA_str = "N/A"            # Used next to progress bar to track ETA in a readable form
+        self.frame_costs = None         # Predicted seconds of every frame (see estimate), only relative costs without past jobs
+        self.tail_seconds = 0           # Predicted seconds from the end of generation to the archived video
+        self.live_estimate = None       # Moving average of actual seconds per predicted second (see update_estimate)
+        self.last_write_time = 0        # When the latest frame was saved
+        self.generating = False         # True while frames are being generated
+        self.upscaling = False          # True while frames are being interpolated
+        self.interpolator = None        # Interpolation worker pool, starts with generation if STREAM_INTERPOLATION is on
+        self.interpolated_pairs = 0     # Frame pairs interpolated so far
+        self.restored_pairs = set()     # Pairs a resumed job already has interpolated (see recover)
+        self.frame_spacing = 1          # Frame j of the video is generated frame j / frame_spacing (see frame_file)
+        self.total_pairs = 0            # Frame pairs to interpolate (known once generation is over)
+        self.video_output = None        # Encodes the MP4 and GIF while rendering if INCREMENTAL_OUTPUT is on
+        self.frame_store = None         # Decoded frames by their number in the final video if FRAME_STORE is on
+        self.cached_frames = 0          # Frames the response cache had (not generated by the server)
+        self.generation_start_time = 0  # Start time for image generation
+        self.date = datetime.now().strftime("%Y-%m-%d_%H-%M-%S") # Date string for naming output files
+        self.resumed = False            # True if this job picks up frames a previous run left (see resume)
+        self.archived = False           # True once the video is in the archive
+        self.events = EventBus()        # Progress is pushed to listeners as it happens (see publish)
+        self.thumbnail_size = None      # (width, height) listeners want frames scaled to fit, None sends events without frames
+
+        # Seed image mask
+        self.alpha = 0                  # Mask that keeps transparency of seed image
+        self.mask_base64 = 0            # Mask for image gen
+
+    @classmethod
+    def resume(cls, output_dir=OUTPUT_PATH):
+        """Loads the job whose journal is in output_dir so it can carry on where it stopped (crash, power cut, closed
+           window). Raises ValueError if there is nothing to resume."""
+
+        records = read_journal(output_dir)
+        if not records or "job" not in records[0]:
+            raise ValueError(f"No job journal in {output_dir} to resume.")
+        job = cls(records[0]["job"], output_dir)
+        job.recover(records[1:])
+        return job
+
+    def run(self):
+        """Renders the whole video, start to finish. A resumed job skips the frames it already has"""
+
+        if self.archived:
+            print(f"Job in {self.output_dir} already finished, archived as {ARCHIVE_PATH}/{self.date}")
+            return
+        if not self.resumed:
+            self.clear_output()
+            self.prepare_seed()
+            self.reuse_frames()
+        self.generating = True
+        try:
+            self.generate_images()  # Use stable diffusion and controlnet to generate all frames (TAKES VERY LONG)
+            self.finish_video()
+        finally:
+            self.generating = False
+            self.upscaling = False
+
+    def clear_output(self):
+        """Creates this job's folders, clears frames of a previous video and puts the seed image in place. With
+           REUSE_FRAMES (and a pinned sampler seed) the previous video's frames and journal are moved aside instead, until
+           reuse_frames is done."""
+
+        shutil.rmtree(self.previous_path, ignore_errors=True)
+        if self.reuses_frames() and os.path.exists(self.journal_path):
+            os.makedirs(self.previous_path)
+            for path in (self.frame_path, self.interpolated_path, self.journal_path):
+                if os.path.exists(path): os.replace(path, os.path.join(self.previous_path, os.path.basename(path)))
+        os.makedirs(self.frame_path, exist_ok=True)
+        for frame in os.listdir(self.frame_path):
+            os.remove(os.path.join(self.frame_path, frame))
+        shutil.rmtree(self.interpolated_path, ignore_errors=True)
+        self.metrics.reset()
+
+        seed_image = self.spec.get("seed_image")
+        if seed_image and os.path.abspath(seed_image) != os.path.abspath(self.seed_input_path): # A draft refined in its own folder already has it
+            shutil.copy(seed_image, self.seed_input_path)
+        elif not os.path.exists(self.seed_input_path): # Otherwise uses the previous seed image
+            shutil.copy(SEED_INPUT_PATH, self.seed_input_path)
+
+        with open(self.journal_path, "w") as journal_file: # Starts a new journal
+            journal_file.write(json.dumps({"job": self.spec}, default=str) + "\n")
+
+    def prepare_seed(self):
+        """Resizes seed image to desired resolution so it flows with rest of frames in the video, and makes its alpha mask"""
+
+        img = Image.open(self.seed_input_path)
+        new_size = (self.resolution_x, self.resolution_y)
+        resized_img = img.resize(new_size)
+        resized_img.save(self.resized_seed_path)
+        self.create_mask(self.resized_seed_path)
+
+        if resized_img.mode == 'RGBA':
+            r, g, b, a = resized_img.split()
+            white_background = Image.new('RGB', resized_img.size, (255, 255, 255))
+            white_background.paste(Image.merge('RGB', (r, g, b)), (0, 0), a)
+            white_background.save(self.resized_seed_path)
+
+        with open(self.resized_seed_path, "rb") as seed_file:
+            self.journal_frame(0, seed_file.read())
+
+    def stop(self):
+        """Interrupts generation. Frames already generated are kept and finish_video() makes the video out of them"""
+
+        self.total_frames = self.generated_frames
+
+    def finish_video(self):
+        """Runs once generation is over (finished or interrupted). Adds the loop frame, interpolates, saves the video and
+           gif and archives everything with its parameters (frames get the alpha mask on the way)."""
+
+        self.generating = False
+        self.total_frames = self.generated_frames
+        self.journal(generated=self.total_frames) # Resuming after this point only redoes the steps below
+        if self.loop:
+            shutil.copy(self.resized_seed_path, f'{self.frame_path}/frame_{self.total_frames + 1}.png')
+            self.total_frames += 1
+            self.generated_frames += 1
+        if self.upscale and self.fps < self.upscale_fps:
+            self.interpolate_frames()
+        self.output()           # Saves video and gif to output folder
+        self.archive_output()
+
+    def archive_output(self):
+        """Copies the output folder (video, gif, frames and parameters) to the archive, named by date. Frames are written
+           there once, masked and at ARCHIVE_COMPRESSION, so the ones in the output folder are never rewritten."""
+
+        date = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        self.date, copy = date, 1
+        while True: # Jobs can finish within the same second, makedirs claims the name even if they finish at the same time
+            try:
+                os.makedirs(f'{ARCHIVE_PATH}/{self.date}')
+                break
+            except FileExistsError:
+                copy += 1
+                self.date = f'{date}_{copy}'
+        self.create_text_file() # Creates file that stores all parameters used to generate that video
+        frames_folder = os.path.relpath(self.frame_path, self.output_dir)
+        skip = [frames_folder, os.path.relpath(self.interpolated_path, self.output_dir), FRAME_STORE_NAME, PREVIOUS_NAME, # Frames are written by apply_masks
+                METRICS_NAME] # and metrics once masking is timed too
+        shutil.copytree(self.output_dir, f'{ARCHIVE_PATH}/{self.date}', dirs_exist_ok=True, # Copies video and gif to archive folder for easy access of previous generations
+                        ignore=lambda folder, names: skip if folder == self.output_dir else [])
+        with self.metrics.time("mask"):
+            self.apply_masks(f'{ARCHIVE_PATH}/{self.date}/{frames_folder}')
+        with self.metrics.time("preview"):
+            self.archive_previews()
+        self.archive_metrics(f'{ARCHIVE_PATH}/{self.date}')
+        if self.frame_store:
+            self.frame_store.close()
+            self.frame_store = None
+        self.journal(archived=self.date)
+        self.archived = True
+        self.publish("archived")
+
+    def archive_metrics(self, folder):
+        """Copies the stage times to the archive folder with their summary (METRICS_SUMMARY_NAME) and prints it"""
+
+        self.metrics.close()
+        try:
+            if os.path.exists(self.metrics.path): shutil.copy2(self.metrics.path, f'{folder}/{METRICS_NAME}')
+            self.metrics.write_prometheus(f'{folder}/{METRICS_SUMMARY_NAME}', job=self.date)
+        except OSError as e:
+            print(f"Error saving stage metrics: {e}")
+        print("Stage times:")
+        self.metrics.print_summary()
+
+    def archive_previews(self):
+        """Makes the archived video's thumbnail and preview clip for the gallery (see PreviewCache), from the decoded frames"""
+
+        try:
+            preview_cache().put(self.date, lambda i: self.read_frame(i, self.frame_file(i)), self.total_frames + 1, self.fps)
+        except (OSError, ValueError) as e: # The video is archived either way, the gallery makes them later
+            print(f"Error making previews: {e}")
+
+    # FRAME REUSE
+    def reuse_frames(self):
+        """Carries over frames 1 to k of the previous job in the output folder or an archived one, where k is as far as
+           that job sent exactly the requests this one would (same seed frame, and nothing before frame k + 1 changed, like
+           when only a later pivot was edited). Frames are chained, so everything from the first changed frame on is
+           generated again. Interpolated pairs inside the reused frames are carried over too."""
+
+        source = self.find_reusable_frames() if self.reuses_frames() else None
+        if source is None:
+            shutil.rmtree(self.previous_path, ignore_errors=True)
+            return
+        folder, old, frames, pairs, last_frame = source
+        print(f"Reusing frames 1-{last_frame} of the job in {folder}, the settings before frame {last_frame + 1} are the same.")
+
+        transfer = os.replace if folder == self.previous_path else shutil.copy2 # The previous folder gets deleted anyway
+        def carry_over(old_path, new_path):
+            if os.path.exists(old_path): transfer(old_path, new_path) # Missing ones are caught by recover
+
+        records = [{"frame": 0, "sha256": file_hash(self.resized_seed_path), "denoise": 0}]
+        for i in range(1, last_frame + 1):
+            carry_over(old.frame_file(i * old.video_multiplier), f'{self.frame_path}/frame_{i}.png')
+            records.append(frames[i])
+        if pairs:
+            os.makedirs(self.interpolated_path, exist_ok=True)
+        for record in pairs:
+            first_pair, last_pair = record["interpolated"]
+            for i in range(first_pair, last_pair + 1):
+                for k in range(1, self.frame_multiplier):
+                    new = (i - 1) * self.frame_multiplier + k
+                    carry_over(old.frame_file(new), f'{self.interpolated_path}/frame_{new}.png')
+            records.append(record)
+        shutil.rmtree(self.previous_path, ignore_errors=True)
+        for record in records[1:]:
+            self.journal(**record)
+        self.recover(records) # Checks the copies against their hashes and picks generation up after them
+
+    def reuses_frames(self):
+        """True if this job starts from a previous job's frames where it can. Only with a pinned sampler seed: with a
+           random one the same requests give different frames, and generating again is how a new take is asked for."""
+
+        return REUSE_FRAMES and self.sampler_seed >= 0
+
+    def find_reusable_frames(self):
+        """Returns (folder, job, frame records, interpolated pair records, last frame) of the previous job (see
+           reuse_frames) that has the most frames this job can use, or None if none has any"""
+
+        folders = [self.previous_path] # The last job in this output folder, then the archive newest first
+        if os.path.isdir(ARCHIVE_PATH):
+            folders += [os.path.join(ARCHIVE_PATH, name) for name in sorted(os.listdir(ARCHIVE_PATH), reverse=True)]
+        best = None
+        for folder in folders:
+            records = read_journal(folder)
+            if not records or "job" not in records[0]:
+                continue
+            try:
+                old = RenderJob(records[0]["job"], folder)
+            except (ValueError, KeyError, TypeError):
+                continue
+            # Frames of the previous job are where they were in the output folder, an archive has all of them in its frames
+            # folder numbered by the final video
+            old.frame_spacing = old.video_multiplier if folder == self.previous_path else 1
+            frames = {record["frame"]: record for record in records if "frame" in record}
+            if 0 not in frames or frames[0]["sha256"] != file_hash(self.resized_seed_path):
+                continue
+            first_frame = old.frame_file(old.video_multiplier)
+            if 1 not in frames or not os.path.exists(first_frame) or file_hash(first_frame) != frames[1]["sha256"]:
+                continue # Frames changed since (archived frames get the alpha mask, so only unmasked ones can be used)
+            limit = min(self.total_frames, old.total_frames)
+            last_frame = 0
+            while (last_frame < limit and last_frame + 1 in frames
+                   and (last_frame == 0 or os.path.exists(old.frame_file((last_frame + 1) * old.video_multiplier)))
+                   and old.schedule.init_frame[last_frame] == self.schedule.init_frame[last_frame] # Made from the same image
+                   and old.frame_request(last_frame + 1) == self.frame_request(last_frame + 1)):
+                last_frame += 1
+            if last_frame > 0 and (best is None or last_frame > best[4]):
+                pairs = [record for record in records if "interpolated" in record and record["interpolated"][1] <= last_frame]
+                if old.video_multiplier != self.video_multiplier: pairs = []
+                best = (folder, old, frames, pairs, last_frame)
+        return best
+
+    # JOURNAL
+    def journal(self, **record):
+        """Appends one record to the job's journal (one JSON object per line). Each line goes to disk straight away, so a
+           crash loses at most the frame being saved."""
+
+        with self.journal_lock, open(self.journal_path, "a") as journal_file: # Frames and interpolated pairs are journaled from different threads
+            journal_file.write(json.dumps(record) + "\n")
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    def journal_frame(self, frame_num, image_bytes, strength=0):
+        """Records a saved frame with the hash of its PNG bytes and the denoise strength it was generated with"""
+
+        self.journal(frame=frame_num, sha256=hashlib.sha256(image_bytes).hexdigest(), denoise=strength)
+
+    def recover(self, records):
+        """Puts the job back in the state its journal records describe. Frames are checked against their hashes, and
+           everything after the last good frame is deleted so generation carries on from there with the right pivot and
+           denoise strength. Interpolated pairs are kept if their frames and the generated frames around them are good."""
+
+        frames = {record["frame"]: record for record in records if "frame" in record}
+        generated = [record["generated"] for record in records if "generated" in record]
+        archived = [record["archived"] for record in records if "archived" in record]
+        if archived:
+            self.date, self.archived = archived[-1], True
+            return
+        if generated: # Generation had finished (or was interrupted on purpose), don't generate past that
+            self.total_frames = generated[-1]
+
+        last_good = -1
+        while last_good + 1 in frames and last_good + 1 <= self.total_frames:
+            path = f'{self.frame_path}/frame_{last_good + 1}.png'
+            if not os.path.exists(path) or file_hash(path) != frames[last_good + 1]["sha256"]:
+                break
+            last_good += 1
+        if last_good < 0:
+            raise ValueError(f"Can't resume {self.output_dir}: its seed frame is missing or changed.")
+
+        for frame in os.listdir(self.frame_path): # The loop frame and anything after the last good frame
+            index = numerical_sort(frame)
+            if isinstance(index, int) and index > last_good:
+                os.remove(os.path.join(self.frame_path, frame))
+
+        # Interpolated pairs, anything not kept gets interpolated again
+        keep = set()
+        for record in records:
+            if "interpolated" not in record: continue
+            first_pair, last_pair = record["interpolated"]
+            paths = [f'{self.interpolated_path}/frame_{(i - 1) * self.frame_multiplier + k}.png'
+                     for i in range(first_pair, last_pair + 1) for k in range(1, self.frame_multiplier)]
+            if last_pair <= last_good and len(paths) == len(record["sha256"]) and all(
+                    os.path.exists(path) and file_hash(path) == sha256 for path, sha256 in zip(paths, record["sha256"])):
+                keep.update(paths)
+                self.restored_pairs.update(range(first_pair, last_pair + 1))
+        if os.path.isdir(self.interpolated_path):
+            for frame in os.listdir(self.interpolated_path):
+                path = f'{self.interpolated_path}/{frame}'
+                if path not in keep:
+                    shutil.rmtree(path) if os.path.isdir(path) else os.remove(path) # Folders are from a RIFE run that was cut off
+
+        # Seed mask (frame 0 on disk has its transparency flattened, so it's made from the seed image again)
+        buffered = BytesIO()
+        Image.open(self.seed_input_path).resize((self.resolution_x, self.resolution_y)).save(buffered, format="PNG")
+        buffered.seek(0)
+        self.create_mask(buffered)
+
+        self.metrics.load() # Summary covers the runs before the resume too
+        self.generated_frames = last_good
+        self.pivot_num = self.schedule.pivot_at(last_good + 1)
+        self.denoising_strength = frames[last_good]["denoise"]
+        self.resumed = True
+        print(f"Resuming {self.output_dir} after frame {last_good}/{self.total_frames}" +
+              (f", {len(self.restored_pairs)} frame pairs already interpolated." if self.restored_pairs else "."))
+
+    # FRAME STORE
+    def open_frame_store(self):
+        """Creates the frame store with a slot for every frame the final video can have (the loop frame included). Frames
+           are read from their PNGs if there isn't the disk space for it."""
+
+        frames = (self.total_frames + 1) * self.video_multiplier + 1
+        try:
+            self.frame_store = FrameStore(self.frame_store_path, frames, self.resolution_x, self.resolution_y)
+        except OSError as e:
+            print(f"Error creating frame store, frames will be read from their files instead: {e}")
+            if os.path.exists(self.frame_store_path): os.remove(self.frame_store_path)
+
+    def store_frame(self, index, image_file):
+        """Decodes image_file (a path or file object) into slot index of the frame store"""
+
+        if self.frame_store:
+            with Image.open(image_file) as image:
+                self.frame_store.put(index, image)
+
+    def read_frame(self, index, path):
+        """Frame index of the final video, from the frame store if it's there or else from its PNG at path"""
+
+        frame = self.frame_store.get(index) if self.frame_store else None
+        return Image.open(path) if frame is None else frame
+
+    # EVENTS
+    def publish(self, kind, frame_num=None):
+        """Sends a RenderEvent to the job's listeners, with generated frame frame_num scaled to fit thumbnail_size if a
+           listener wants frames. Runs on the render thread, so the listener gets the frame ready to show."""
+
+        if not self.events.listeners: return
+        thumbnail = None
+        if frame_num is not None and self.thumbnail_size:
+            try:
+                thumbnail = self.thumbnail(frame_num)
+            except OSError as e:
+                print(f"Error making thumbnail of frame {frame_num}: {e}")
+        self.events.publish(RenderEvent(kind, self, thumbnail))
+
+    def thumbnail(self, frame_num):
+        """Generated frame frame_num as an RGB image scaled to fit thumbnail_size (decoded pixels come from the frame store)"""
+
+        frame = self.read_frame(frame_num * self.video_multiplier, f'{self.frame_path}/frame_{frame_num}.png')
+        image = Image.fromarray(np.asarray(frame)) if isinstance(frame, np.ndarray) else frame.convert('RGB')
+        scale = min(self.thumbnail_size[0] / image.width, self.thumbnail_size[1] / image.height)
+        return image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.BICUBIC)
+
+    # MASKS
+    def create_mask(self, path):
+        """Creates a mask if image has an alpha channel. Only changes image in non-transparent areas."""
+
+        img = Image.open(path).convert("RGBA")
+        self.alpha = np.array(img.split()[-1])  # Isolates alpha channel
+        mask_bin = (self.alpha > 0).astype(np.uint8) * 255  # Binarizes the output
+        mask_image = Image.fromarray(mask_bin).convert("L")
+        buffered = BytesIO()
+        mask_image.save(buffered, format="PNG")
+        self.mask_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8") # Encodes in base64
+
+    def apply_masks(self, folder):
+        """Post-processing that makes sure all images maintain alpha channel: writes every frame to folder with the seed's
+           alpha. If the seed image has no transparency the frames are copied as they are, otherwise they're split into
+           chunks that are masked by a pool of processes."""
+
+        os.makedirs(folder, exist_ok=True)
+        if isinstance(self.alpha, np.ndarray) and self.alpha.min() == 255:
+            print("Seed image is fully opaque, no alpha masks to apply.")
+            for i in range(self.total_frames + 1):
+                shutil.copy2(self.frame_file(i), f'{folder}/frame_{i}.png')
+            return
+        print("Applying alpha masks to frames.")
+        store = self.frame_store
+        frames = [(self.frame_file(i), i if store and store.get(i) is not None else None, f'frame_{i}.png') # Stored frames aren't decoded again
+                  for i in range(self.total_frames + 1)]
+        store = (store.path, store.shape) if store else None
+        chunks = [frames[i:i + MASK_CHUNK] for i in range(0, len(frames), MASK_CHUNK)]
+        workers = min(MASK_WORKERS, len(chunks))
+        if workers < 2:
+            mask_frames(frames, folder, self.alpha, ARCHIVE_COMPRESSION, store)
+            return
+        # Spawned rather than forked, forking a process that has the window and render threads running isn't safe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            for _ in pool.map(mask_frames, chunks, [folder] * len(chunks), [self.alpha] * len(chunks),
+                              [ARCHIVE_COMPRESSION] * len(chunks), [store] * len(chunks)):
+                pass # Raises if a chunk failed
+
+    # IMAGE GENERATION
+    def build_payload(self, prompt, style, denoise, sampler_seed=-1):
+        """Builds the img2img request data for one frame. The seed image is left as SEED_PLACEHOLDER, see encode_payload"""
+
+        payload = {
+            "prompt": f"Very detailed, desaturated. {prompt}, {style} style. Sharp, interesting images emerging from nothing. Realistic, in-focus",
+            "negative_prompt": "Saturated, sharp edges, repeating patterns, nonsense, blurry, fuzzy, nsfw, watermark.", # Can change surrounding prompt to your liking (advanced)
+            "init_images": [SEED_PLACEHOLDER],
+            "denoising_strength": denoise,
+            "steps": self.steps,
+            "cfg_scale": self.cfg_scale,
+            "width": self.resolution_x,
+            "height": self.resolution_y,
+            "alwayson_scripts": {
+                "controlnet": {
+                    "args": [
+                        {
+                        "enabled": True,
+                        "image": SEED_PLACEHOLDER,
+                        "weight": PROMPT_WEIGHT,
+                        "module": "openpose_full",
+                        "model": "control_sd15_hed [fef5e48e]",
+                        }
+                    ]
+                }
+            },
+        }
+        if sampler_seed >= 0:
+            payload["seed"] = sampler_seed
+        return payload
+
+    def generate_image(self, body):
+        """Sends one img2img request and returns the generated image in base64, or None if the server failed to make the
+           frame even after retrying."""
+
+        try:
+            return backends.send(lambda client: client.img2img(body=body)[0]) # Retries with backoff, then tries other backends
+        except WebUIError as e:
+            print(f"Error generating image: {e}")
+            return None
+
+    def cache_key(self, body):
+        """Response cache key of a request body, or None if frames aren't repeatable (no pinned sampler seed)"""
+
+        return response_cache.key(body) if self.sampler_seed >= 0 else None
+
+    def cached_frame(self, key, frame_num, pivot, strength):
+        """The frame the response cache has for key as a GeneratedFrame, or None"""
+
+        if not key: return None
+        with self.metrics.time("cache", frame=frame_num):
+            image_bytes = response_cache.get(key)
+        if image_bytes is None: return None
+        self.cached_frames += 1
+        frame = GeneratedFrame.from_bytes(frame_num, image_bytes, pivot, strength)
+        frame.cached = True
+        return frame
+
+    def save_frame(self, frame):
+        """Saves a generated frame as frame_{frame_num}.png"""
+
+        with open(f"{self.frame_path}/frame_{frame.frame_num}.png", "wb") as image_file:
+            image_file.write(frame.image_bytes) # Save generated frame to folder
+
+    def plan_requests(self):
+        """Yields (frame_num, pivot, strength, pieces) for every frame left to generate, where pieces is the frame's
+           serialized request waiting for its seed image (see encode_payload)."""
+
+        for frame_num in range(self.generated_frames + 1, self.total_frames + 1):
+            with self.metrics.time("build", frame=frame_num):
+                pivot, strength, payload = self.frame_request(frame_num)
+                pieces = encode_payload(payload)
+            yield frame_num, pivot, strength, pieces
+
+    def frame_request(self, frame_num):
+        """(pivot, denoise strength, request data) of frame_num, from the schedule. A draft's frames get the pivot, denoise
+           strength and sampler seed of the timeline frame they stand in for, so they follow the same curve as the full video."""
+
+        pivot, strength, sampler_seed = self.schedule.row(frame_num)
+        return pivot, strength, self.build_payload(self.prompts[pivot], self.styles[pivot], strength, sampler_seed)
+
+    def prepare_requests(self, request_queue, stop):
+        """Prefetch stage: works out each frame's pivot and denoise strength and serializes its request while the previous
+           request is still on the server. The request stage only has to splice in the seed image."""
+
+        for request in self.plan_requests():
+            if not put_until_stopped(request_queue, request, stop): return
+        put_until_stopped(request_queue, None, stop) # Tells request stage there are no more frames
+
+    def write_frames(self, write_queue, stop, errors):
+        """Writeback stage: decodes and saves finished frames, then updates the counters the window and terminal read,
+           so none of this holds up the next request. Keeps draining after an error so the request stage never blocks on it."""
+
+        while True:
+            frame = write_queue.get()
+            if frame is None: return
+            if errors: continue
+
+            with self.metrics.time("decode", frame=frame.frame_num):
+                image_bytes = frame.image_bytes
+            try:
+                with self.metrics.time("write", frame=frame.frame_num):
+                    self.save_frame(frame)
+                    self.journal_frame(frame.frame_num, image_bytes, frame.strength)
+            except OSError as e:
+                print(f"Error saving frame {frame.frame_num}: {e}")
+                errors.append(e)
+                stop.set()
+                continue
+
+            if frame.cache_key:
+                try:
+                    with self.metrics.time("cache", frame=frame.frame_num):
+                        response_cache.put(frame.cache_key, image_bytes)
+                except OSError as e:
+                    print(f"Error caching frame {frame.frame_num}: {e}")
+            with self.metrics.time("store", frame=frame.frame_num):
+                self.store_frame(frame.frame_num * self.video_multiplier, BytesIO(image_bytes))
+            self.pivot_num = frame.pivot
+            self.denoising_strength = frame.strength
+            self.generated_frames = frame.frame_num # Window shows frame_{generated_frames}.png so this only changes once it's on disk
+            self.update_estimate(frame)
+            self.update_debug_progress_bar()
+            self.publish("frame", self.generated_frames)
+            self.pivot_num = self.schedule.pivot_at(self.generated_frames + 1) # Moves on if a new pivot is starting
+            if self.interpolator: self.interpolator.add_frames(self.generated_frames) # Starts on the frames finished so far
+            if self.video_output and self.video_output.multiplier == 1: self.update_video_output(self.generated_frames)
+
+    def generate_chained_frames(self, seed_frame, write_queue, stop):
+        """Seed incrementing: every frame is generated from the previous one, so frames go one at a time (to whichever
+           backend is least busy, which lets separate jobs share the backends). The next request is prepared while the
+           current one is on the server, and the previous frame is sent back straight from memory."""
+
+        request_queue = queue.Queue(maxsize=PREFETCH_DEPTH)
+        preparer = threading.Thread(target=self.prepare_requests, args=(request_queue, stop), daemon=True)
+        preparer.start()
+
+        last_frame = seed_frame # Frame chain: the previous frame stays in memory to be used as the next seed
+        while not stop.is_set():
+            item = request_queue.get()
+            if item is None: break
+            frame_num, pivot, strength, pieces = item
+            if not self.generating or frame_num > self.total_frames: break # Stops video generation when interrupted
+
+            with self.metrics.time("splice", frame=frame_num):
+                body = join_payload(pieces, last_frame)
+                key = self.cache_key(body)
+            frame = self.cached_frame(key, frame_num, pivot, strength)
+            if frame is None:
+                with self.metrics.time("post", frame=frame_num):
+                    image_base64 = self.generate_image(body) # Generates and retrieves output image
+                if image_base64 is None:
+                    print(f"Stopping generation at frame {frame_num}, the server could not generate it.")
+                    break
+                frame = GeneratedFrame(frame_num, image_base64, pivot, strength, cache_key=key)
+            last_frame = frame
+            put_until_stopped(write_queue, last_frame, stop)
+
+        stop.set()
+        preparer.join()
+
+    def generate_independent_frames(self, seed_frame, write_queue, stop):
+        """Seed incrementing disabled: every frame only uses the seed image, so frames are generated in parallel across all
+           backends (see WEBUI_BACKENDS) and handed to the writeback stage in frame order."""
+
+        finished = {} # Frames that came back before an earlier one
+        next_frame = self.generated_frames + 1
+        lock = threading.Lock()
+
+        def request(client, task):
+            frame_num, pivot, strength, pieces = task
+            with self.metrics.time("splice", frame=frame_num):
+                body = join_payload(pieces, seed_frame)
+                key = self.cache_key(body)
+            frame = self.cached_frame(key, frame_num, pivot, strength)
+            if frame is None:
+                with self.metrics.time("post", frame=frame_num):
+                    image_base64 = client.img2img(body=body)[0]
+                frame = GeneratedFrame(frame_num, image_base64, pivot, strength, cache_key=key)
+            return frame
+
+        def on_result(task, frame):
+            nonlocal next_frame
+            with lock:
+                finished[frame.frame_num] = frame
+                while next_frame in finished:
+                    put_until_stopped(write_queue, finished.pop(next_frame), stop)
+                    next_frame += 1
+
+        def should_stop(task):
+            return stop.is_set() or not self.generating or task[0] > self.total_frames # Stops video generation when interrupted
+
+        if not backends.map(list(self.plan_requests()), request, on_result, should_stop):
+            print(f"Stopping generation at frame {next_frame}, no server could generate it.")
+
+    def generate_images(self):
+        """Generate a series of images based on the collected prompts and parameters.
+           Finished frames are saved by a separate writeback thread, so the server never waits on file or base64 work.
+           Frames come out the same as generating them one at a time."""
+
+        self.generation_start_time = time.time()
+        estimate = self.estimate(learn_stage_costs())
+        if estimate is not None:
+            self.ETA_str = format_duration(estimate)
+            print(f"Estimated time: {self.ETA_str}")
+        if self.video_multiplier > 1 and self.upscale_fps != self.spec.get("upscale_fps", DEFAULT_UPSCALED_FPS):
+            print(f"Upscaled FPS {self.spec.get('upscale_fps', DEFAULT_UPSCALED_FPS)} isn't a whole multiple of {self.fps} FPS, "
+                  f"upscaling to {self.upscale_fps} FPS instead so the video plays at the right speed.")
+        self.last_write_time = time.perf_counter()
+        if FRAME_STORE:
+            self.open_frame_store()
+        if STREAM_INTERPOLATION and self.upscale and self.frame_multiplier > 1:
+            self.interpolator = Interpolator(self)
+        if INCREMENTAL_OUTPUT:
+            self.video_output = IncrementalOutput(self)
+            if self.video_output.multiplier == 1:
+                self.update_video_output(self.generated_frames) # Frame 0 (and the frames a resumed job already has)
+            elif self.interpolator:
+                self.update_video_output(self.interpolator.pairs_in_order * self.frame_multiplier) # Pairs a resumed job already has
+            else:
+                self.update_video_output(0)
+        self.publish("start", self.generated_frames)
+        stop = threading.Event()
+        write_queue = queue.Queue(maxsize=WRITEBACK_DEPTH)
+        errors = []
+        writer = threading.Thread(target=self.write_frames, args=(write_queue, stop, errors), daemon=True)
+        writer.start()
+
+        if not self.schedule.init_frame.any(): # Every frame starts from the seed image (see FrameSchedule)
+            self.generate_independent_frames(GeneratedFrame.from_file(0, self.resized_seed_path), write_queue, stop)
+        else: # Chains on from the last frame (frame 0 unless the job was resumed)
+            last_frame_path = f'{self.frame_path}/frame_{self.generated_frames}.png'
+            self.generate_chained_frames(GeneratedFrame.from_file(self.generated_frames, last_frame_path), write_queue, stop)
+
+        stop.set()
+        write_queue.put(None)
+        writer.join() # Frames already generated still get saved
+        if self.cached_frames:
+            print(f"{self.cached_frames} frames came from the response cache.")
+
+    # UPSCALING
+    def interpolate_frames(self):
+        """Calls a separate AI C++ library to upscale the current video to 60fps. Frame pairs are interpolated by a pool of
+           workers (see Interpolator). No frame is moved: from here on frames are counted in the upscaled video, and
+           frame_file finds each one where it was saved."""
+
+        frame_multiplier = self.frame_multiplier
+        self.fps = self.upscale_fps
+        self.upscaling = True
+        self.publish("upscale")
+        if self.interpolator is None: # Not started during generation
+            self.interpolator = Interpolator(self)
+        self.interpolator.finish(self.total_frames) # Waits for every pair to be done
+        self.interpolator = None
+
+        self.frame_spacing = frame_multiplier
+        self.total_frames *= frame_multiplier
+        self.generated_frames = self.total_frames
+        if self.video_output: self.update_video_output(self.total_frames)
+        print('Interpolation completed.')
+        self.upscaling = False
+
+    def frame_file(self, frame, spacing=None):
+        """Path of frame of the video when generated frames are spacing apart in it (frame_spacing by default, which is
+           1 until the video is upscaled). Generated frame i is frame i * spacing and stays frame_i.png in the frames
+           folder, the frames between them are in the interpolated folder under their own number."""
+
+        spacing = spacing or self.frame_spacing
+        if frame % spacing == 0:
+            return f'{self.frame_path}/frame_{frame // spacing}.png'
+        return f'{self.interpolated_path}/frame_{frame}.png'
+
+    def interpolate_frame(self, frame_1_path, frame_2_path, new_frame_path, timestep=0.5):
+        """Calls RIFE C++ library to interpolate given frames"""
+
+        command = [
+            RIFE_PATH,
+            '-0', frame_1_path,      # first frame
+            '-1', frame_2_path,      # second frame
+            '-o', new_frame_path,    # output frame
+            '-s', str(timestep),     # how far from the first frame to the second
+            '-m', RIFE_MODEL_PATH
+        ]
+        try:
+            subprocess.run(command, check=True)
+            print(f'Interpolation successful.')
+        except subprocess.CalledProcessError as e:
+            print("Error during interpolation:", e)
+
+    # FILE MANAGEMENT
+    def output(self):
+        """Generate the output video (.mp4) and GIF from the generated frames. If they were encoded while rendering
+           (see IncrementalOutput) only the last frames are added and the files closed, otherwise it's done in one pass
+           where each frame is read once and handed to both encoders, so memory use stays the same however long the video is."""
+
+        if self.video_output:
+            self.update_video_output(self.total_frames)
+        if self.video_output and self.video_output.close():
+            self.video_output = None
+            print(f"MP4 saved as {self.video_path}")
+            print(f"GIF saved as {self.gif_path}")
+            return
+        self.video_output = None
+
+        # Removes old output
+        if os.path.exists(self.video_path):
+            os.remove(self.video_path)
+        if os.path.exists(self.gif_path):
+            os.remove(self.gif_path)
+
+        video = Mp4Writer(self.video_path, self.fps, fragmented=False)
+        gif = GifWriter(self.gif_path, self.fps)
+        try:
+            for i in range(self.total_frames + 1):
+                with self.metrics.time("encode", frame=i):
+                    frame = self.read_frame(i, self.frame_file(i))
+                    video.append(frame)
+                    gif.append(frame)
+        finally:
+            with self.metrics.time("finish"):
+                video.close()
+                gif.close()
+        print(f"MP4 saved as {self.video_path}")
+        print(f"GIF saved as {self.gif_path}")
+
+    def update_video_output(self, last_frame):
+        """Hands the frames of the final video up to last_frame to the incremental encoders. If encoding fails, the video is
+           made from the frames at the end instead (so a broken encoder never stops generation)."""
+
+        video_output = self.video_output
+        if video_output is None: return
+        try:
+            video_output.update(last_frame)
+        except Exception as e:
+            print(f"Error encoding video while rendering, it will be encoded at the end instead: {e}")
+            self.video_output = None
+            video_output.close()
+
+    def create_text_file(self):
+        """Creates a text file with parameters used for the video generation [NOT CONFIRMED TO WORK YET]."""
+
+        generation_end_time = time.time()
+        with open(self.parameters_path, "w") as file:
+            # Global params/info
+            file.write("Date: " + str(self.date))
+            file.write("\n\nResolution: " + str(self.resolution_x) + ' x ' + str(self.resolution_y))
+            file.write("\nFPS: " + str(self.fps))
+            file.write("\nSteps: " + str(self.steps))
+            file.write("\nSampler Seed: " + (str(self.sampler_seed) if self.sampler_seed >= 0 else "Random"))
+            file.write("\nTime Elapsed: " + str(int(generation_end_time - self.generation_start_time)) + " seconds")
+            file.write("\nVideo Length: " + str(int(self.total_frames / self.fps)) + " seconds")
+            file.write("\nTotal Frames: " + str(self.total_frames))
+            if self.draft_of:
+                full = RenderJob(self.draft_of)
+                file.write(f"\nDraft of: {full.resolution_x} x {full.resolution_y}, {full.steps} steps, {full.fps} FPS (every {self.frame_stride} frames shown)")
+
+            # pivot params
+            for i in range(len(self.noise_amps)):
+                file.write(f"\n\nSegment {i + 1} Parameters:\n - Prompt: {self.prompts[i]}\n - Style: {self.styles[i]}\n - Noise Amplifier: {self.noise_amps[i]}\n - Duration: {self.timestamps[i]}")
+            file.write("\n\nDO NOT EDIT THE NAME OR CONTENTS OF THIS FILE")
+            print("Parameter file updated.")
+
+    # TIME ESTIMATE
+    def stage_work(self, stage, **labels):
+        """Units of work (see StageCosts) one run of stage does in this job, from the labels it's timed with: megapixel-steps
+           the server samples (img2img runs steps * denoise of them), megapixels RIFE makes, megapixels of the whole video
+           for finishing and masking, and megapixels of one frame for everything else."""
+
+        megapixels = self.resolution_x * self.resolution_y / 1e6
+        if stage == "post":
+            return megapixels * self.steps * float(self.schedule.strength[labels["frame"] - 1])
+        if stage == "interpolate":
+            first, last = labels["pairs"]
+            return megapixels * (last - first + 1) * (self.frame_multiplier - 1)
+        if stage in ("finish", "mask"):
+            return megapixels * ((self.total_frames + self.loop) * self.video_multiplier + 1)
+        return megapixels
+
+    def estimate(self, costs=None):
+        """Predicts how long the job takes from the stage costs of past jobs (see learn_stage_costs): seconds of every frame
+           and of what's left once generation is over (the last interpolation runs, encoding, masking, previews).
+           Returns the total seconds left, or None without history, in which case frame costs are relative and
+           update_estimate learns what they're worth from the first frames."""
+
+        work = self.resolution_x * self.resolution_y / 1e6 * self.steps * self.schedule.strength
+        predicted = costs.predict("post", 1, work) if costs else None
+        if predicted is None:
+            self.frame_costs, self.tail_seconds = work, 0
+            self.live_estimate = LiveEstimate()
+            return None
+        self.frame_costs = predicted
+        self.live_estimate = LiveEstimate(costs.frame_ratio() or 1.0)
+
+        video_frames = (self.total_frames + self.loop) * self.video_multiplier + 1
+        tail = sum(costs.predict(stage, 1, self.stage_work(stage)) or 0 for stage in ("finish", "mask", "preview"))
+        pairs_left = 0 # Frame pairs interpolated after generation: the last chunk when streaming, otherwise all of them
+        if self.video_multiplier > 1:
+            pairs = self.total_frames + self.loop
+            pairs_left = min(pairs, INTERPOLATION_CHUNK + self.loop) if STREAM_INTERPOLATION else pairs
+            runs = min(pairs_left, INTERPOLATION_WORKERS) # Split across workers running at the same time
+            if runs: tail += (costs.predict("interpolate", runs, self.stage_work("interpolate", pairs=[1, pairs_left])) or 0) / runs
+        encoded = min(video_frames, (pairs_left or self.loop) * self.video_multiplier + 1) if INCREMENTAL_OUTPUT else video_frames
+        tail += costs.predict("encode", encoded, encoded * self.stage_work("encode")) or 0
+        self.tail_seconds = tail
+        return self.live_estimate.ratio * float(self.frame_costs[self.generated_frames:].sum()) + tail
+
+    def update_estimate(self, frame):
+        """Corrects the ETA with how long frame took, since the frame before it was saved. Frames from the response cache
+           don't say anything about the server and are skipped."""
+
+        now = time.perf_counter()
+        seconds, self.last_write_time = now - self.last_write_time, now
+        if self.live_estimate is None: return
+        if not frame.cached:
+            self.live_estimate.update(seconds, float(self.frame_costs[frame.frame_num - 1]))
+        if self.live_estimate.ratio is not None:
+            self.ETA_str = format_duration(self.live_estimate.ratio * float(self.frame_costs[frame.frame_num:].sum()) + self.tail_seconds)
+
+    def update_debug_progress_bar(self):
+        """Updates a progress bar displayed in the terminal with ETA, frames generated, and image parameters. Not used in window"""
+
+        generated_frames, total_frames = self.generated_frames, self.total_frames
+        if total_frames == 0: return
+        percent = generated_frames / total_frames * 100
+        filled_length = int(PROGRESS_BAR_LENGTH * generated_frames // total_frames)
+        bar = '█' * filled_length + '-' * (PROGRESS_BAR_LENGTH - filled_length)
+        
+        print(f'\nPrompt: {self.prompts[self.pivot_num]}        Style: {self.styles[self.pivot_num]}\n|{bar}| {percent:.2f}% Complete\nFrame: {generated_frames}/{total_frames}' + 
+              f' - Estimated time remaining: {self.ETA_str}                                   ')
+        print(f'Denoise Strength: {self.denoising_strength}\nSteps: {self.steps}\nFPS: {self.fps}\nCFG Scale: {self.cfg_scale}')    # Debug logs parameters
+
+class Interpolator:
+    """Pool of RIFE workers for one job. Pair i is the gap between generated frames i - 1 and i, and pairs are handed out
+       in chunks as soon as both of their frames are saved, so interpolation can run while later frames are still being
+       generated. Each chunk is one RIFE run in directory mode. New frames are saved in the job's interpolated folder
+       under their number in the upscaled video (frame k of pair i is frame (i - 1) * frame_multiplier + k)."""
+
+    def __init__(self, job, workers=None):
+        self.job = job
+        self.frame_multiplier = job.frame_multiplier
+        self.workers = workers or INTERPOLATION_WORKERS
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.chunks = []            # Futures of the chunks handed out
+        self.next_pair = 1          # First pair not handed out yet
+        self.done_pairs = set(job.restored_pairs) # Pairs interpolated after a pair before them that isn't done yet
+        self.pairs_in_order = 0     # Pairs 1 to this are all done
+        while self.pairs_in_order + 1 in self.done_pairs:
+            self.pairs_in_order += 1
+            self.done_pairs.remove(self.pairs_in_order)
+        job.interpolated_pairs = len(job.restored_pairs)
+        self.lock = threading.Lock()
+        os.makedirs(job.interpolated_path, exist_ok=True)
+
+    def add_frames(self, generated_frames, chunk_size=INTERPOLATION_CHUNK):
+        """Hands out full chunks of the pairs whose frames are all saved (frames 0 to generated_frames)"""
+
+        while generated_frames - self.next_pair + 1 >= chunk_size:
+            self.chunks.append(self.pool.submit(self.interpolate_chunk, self.next_pair, self.next_pair + chunk_size - 1))
+            self.next_pair += chunk_size
+
+    def finish(self, total_frames):
+        """Hands out the pairs left, split evenly across the workers, and waits until every pair is interpolated"""
+
+        self.job.total_pairs = total_frames
+        left = total_frames - self.next_pair + 1
+        if left > 0 and self.frame_multiplier > 1:
+            self.add_frames(total_frames, -(-left // self.workers)) # Rounds up
+            if self.next_pair <= total_frames:
+                self.chunks.append(self.pool.submit(self.interpolate_chunk, self.next_pair, total_frames))
+                self.next_pair = total_frames + 1
+        try:
+            for chunk in self.chunks:
+                chunk.result() # Raises any error a worker hit
+        finally:
+            self.pool.shutdown()
+
+    def interpolate_chunk(self, first_pair, last_pair):
+        """Worker: interpolates pairs first_pair to last_pair, skipping any a resumed job already has. Falls back to one
+           RIFE run per frame if the batched run fails. Finished pairs are journaled with the hashes of their frames."""
+
+        job = self.job
+        todo = [pair for pair in range(first_pair, last_pair + 1) if pair not in job.restored_pairs]
+        runs = [] # Unbroken stretches of pairs to interpolate
+        for pair in todo:
+            if runs and runs[-1][1] == pair - 1:
+                runs[-1][1] = pair
+            else:
+                runs.append([pair, pair])
+        for first, last in runs:
+            self.interpolate_run(first, last)
+
+        with self.lock:
+            job.interpolated_pairs += len(todo)
+            print(f'Interpolated frame pairs {first_pair}-{last_pair} ({job.interpolated_pairs} done)')
+            self.done_pairs.update(range(first_pair, last_pair + 1))
+            while self.pairs_in_order + 1 in self.done_pairs:
+                self.pairs_in_order += 1
+                self.done_pairs.remove(self.pairs_in_order)
+            pairs_in_order = self.pairs_in_order
+        job.update_video_output(pairs_in_order * self.frame_multiplier) # That stretch of the upscaled video is ready
+        job.publish("upscale")
+
+    def interpolate_run(self, first_pair, last_pair):
+        """Interpolates pairs first_pair to last_pair (all of them), then stores and journals the new frames"""
+
+        job, frame_multiplier = self.job, self.frame_multiplier
+        # (first frame, second frame, frame number in the upscaled video, timestep) for every new frame
+        plan = [(i - 1, i, (i - 1) * frame_multiplier + k, k / frame_multiplier)
+                for i in range(first_pair, last_pair + 1) for k in range(1, frame_multiplier)]
+
+        with job.metrics.time("interpolate", pairs=[first_pair, last_pair]):
+            if not RIFE_BATCH or not self.interpolate_sequence(first_pair - 1, last_pair, plan):
+                for first, second, new, timestep in plan:
+                    job.interpolate_frame(f'{job.frame_path}/frame_{first}.png', f'{job.frame_path}/frame_{second}.png', f'{job.interpolated_path}/frame_{new}.png', timestep)
+        hashes = []
+        for _, _, new, _ in plan:
+            with job.metrics.time("store", frame=new):
+                with open(f'{job.interpolated_path}/frame_{new}.png', 'rb') as frame_file:
+                    image_bytes = frame_file.read()
+                hashes.append(hashlib.sha256(image_bytes).hexdigest())
+                job.store_frame(new, BytesIO(image_bytes))
+        job.journal(interpolated=[first_pair, last_pair], sha256=hashes)
+
+    def interpolate_sequence(self, first_frame, last_frame, plan):
+        """Makes every frame in plan with a single RIFE run over generated frames first_frame to last_frame, instead of
+           starting RIFE (and loading the model) for every frame. Returns False if RIFE failed."""
+
+        job, frame_multiplier = self.job, self.frame_multiplier
+        with tempfile.TemporaryDirectory(dir=job.interpolated_path) as folder:
+            input_path, output_path = f'{folder}/in', f'{folder}/out'
+            os.makedirs(input_path)
+            os.makedirs(output_path)
+            for position, frame in enumerate(range(first_frame, last_frame + 1)):
+                try:
+                    os.link(f'{job.frame_path}/frame_{frame}.png', f'{input_path}/{position:08d}.png') # No copying
+                except OSError:
+                    shutil.copy(f'{job.frame_path}/frame_{frame}.png', f'{input_path}/{position:08d}.png')
+
+            command = [
+                RIFE_PATH,
+                '-i', input_path,                                                 # folder of frames
+                '-o', output_path,                                                # folder for output frames
+                '-n', str((last_frame - first_frame + 1) * frame_multiplier),     # output i is at time i / frame_multiplier of the input
+                '-m', RIFE_MODEL_PATH                                             # model that can interpolate at any timestep
+            ]
+            try:
+                subprocess.run(command, check=True)
+            except subprocess.CalledProcessError as e:
+                print("Error during batched interpolation, interpolating one frame at a time instead:", e)
+                return False
+
+            # Output i is saved as i + 1 (RIFE numbers files from 1), outputs on a generated frame are copies and not needed
+            for first, second, new, timestep in plan:
+                output = new - first_frame * frame_multiplier
+                os.replace(f'{output_path}/{output + 1:08d}.png', f'{job.interpolated_path}/frame_{new}.png')
+        return True
+
+class IncrementalOutput:
+    """Encodes a job's MP4 (fragmented, so it plays mid-run) and GIF while it renders. Frames of the final video are added
+       in order as soon as they exist: generated frames as they are saved, or when upscaling, each stretch of the upscaled
+       video once its frame pairs are interpolated."""
+
+    def __init__(self, job):
+        self.job = job
+        self.multiplier = job.video_multiplier
+        fps = job.upscale_fps if job.upscale and job.fps < job.upscale_fps else job.fps # Same check as finish_video
+        for path in (job.video_path, job.gif_path):
+            if os.path.exists(path): os.remove(path)
+        self.video = Mp4Writer(job.video_path, fps)
+        self.gif = GifWriter(job.gif_path, fps)
+        self.next_frame = 0     # Next frame of the final video to encode
+        self.failed = False
+        self.lock = threading.Lock()
+
+    def update(self, last_frame):
+        """Encodes the frames from the last one encoded up to last_frame"""
+
+        with self.lock:
+            if self.failed: return
+            try:
+                while self.next_frame <= last_frame:
+                    with self.job.metrics.time("encode", frame=self.next_frame):
+                        image = self.job.read_frame(self.next_frame, self.job.frame_file(self.next_frame, self.multiplier))
+                        self.video.append(image)
+                        self.gif.append(image)
+                    self.next_frame += 1
+            except Exception:
+                self.failed = True
+                raise
+
+    def close(self):
+        """Finishes both files. Returns False if encoding failed at some point"""
+
+        with self.lock, self.job.metrics.time("finish"):
+            try:
+                self.video.close()
+                self.gif.close()
+            except Exception as e:
+                print(f"Error finishing video: {e}")
+                self.failed = True
+            return not self.failed
+
+def upscaled_fps(fps, upscale_fps):
+    """FPS a video at fps is interpolated to when upscale_fps is asked for: the nearest whole multiple of fps (halves
+       round up), as generated frames stay at whole frames of the upscaled video. 24 -> 60 gives 72, 40 -> 50 gives 40."""
+
+    return fps * max(1, int(upscale_fps / fps + 0.5))
+
+def run_job(spec, output_dir=OUTPUT_PATH, resume=False):
+    """Renders a whole video from a job spec (see RenderJob) with no window, start to finish. Returns the finished job.
+       With resume, a journal of the same spec in output_dir is picked up where it stopped instead of starting over."""
+
+    records = read_journal(output_dir) if resume else []
+    if records and records[0].get("job") == json.loads(json.dumps(spec, default=str)):
+        job = RenderJob.resume(output_dir)
+    else:
+        job = RenderJob(spec, output_dir)
+    job.run()
+    return job
+
+def draft_spec(spec, scale=DRAFT_SCALE, steps=DRAFT_STEPS, stride=DRAFT_STRIDE):
+    """Spec of a quick preview of spec: the same pivot timeline and denoise curve at scale times the resolution (rounded
+       to multiples of 8, which the webui needs), steps sampling steps, every stride frames and no interpolation. The fps is
+       divided by stride so the preview runs as long as the video. The full spec is kept as "draft_of" for refine_spec. A
+       random sampler seed is pinned first, so the draft and its refinement get the same seed for every frame."""
+
+    spec = dict(spec)
+    if int(spec.get("sampler_seed", DEFAULT_SAMPLER_SEED)) < 0:
+        spec["sampler_seed"] = random.randrange(2 ** 30)
+    full = dict(spec)
+    for field, default in (("resolution_x", DEFAULT_RESOLUTION[0]), ("resolution_y", DEFAULT_RESOLUTION[1])):
+        spec[field] = max(64, int(int(spec.get(field, default)) * scale) // 8 * 8)
+    spec["steps"] = min(int(spec.get("steps", DEFAULT_STEPS)), steps)
+    spec["frame_stride"] = stride
+    spec["fps"] = spec.get("fps", DEFAULT_FPS) / stride
+    spec["upscale"] = False
+    spec["draft_of"] = full
+    return spec
+
+def refine_spec(path):
+    """Spec of the full quality video an approved draft previews. path is the draft's output or archive folder (or its
+       journal, which records the spec it was rendered from). The refinement starts from the seed image and sampler seed
+       the draft was made with, even if the draft took them from the output folder. Raises ValueError if it isn't a draft."""
+
+    folder = os.path.dirname(path) if path.endswith(JOURNAL_NAME) else path
+    records = read_journal(folder)
+    if not records or not records[0].get("job", {}).get("draft_of"):
+        raise ValueError(f"{path} is not a draft (no draft job journal in it).")
+    draft = records[0]["job"]
+    spec = dict(draft["draft_of"])
+    if not spec.get("seed_image") and os.path.exists(f'{folder}/seed_frame.png'): # Not the previous seed image, it may have changed since
+        spec["seed_image"] = f'{folder}/seed_frame.png'
+    spec.setdefault("sampler_seed", draft.get("sampler_seed", DEFAULT_SAMPLER_SEED))
+    return spec
+
+def read_journal(output_dir):
+    """Returns the records in output_dir's job journal, or [] if there isn't one. A last line cut short by a crash is skipped"""
+
+    records = []
+    if not os.path.exists(f'{output_dir}/{JOURNAL_NAME}'):
+        return records
+    with open(f'{output_dir}/{JOURNAL_NAME}') as journal_file:
+        for line in journal_file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+    return records
+
+def learn_stage_costs(archive_path=None, history=ETA_HISTORY_JOBS):
+    """Fits StageCosts to the stage times (metrics.jsonl) of the newest history jobs in the archive. Each job's journal
+       has its spec, which says how much work every timed run was (see RenderJob.stage_work)."""
+
+    archive_path = archive_path or ARCHIVE_PATH
+    costs = StageCosts()
+    if not os.path.isdir(archive_path): return costs
+    folders = [f'{archive_path}/{name}' for name in sorted(os.listdir(archive_path))] # Named by date, newest last
+    folders = [folder for folder in folders if os.path.exists(f'{folder}/{METRICS_NAME}') and os.path.exists(f'{folder}/{JOURNAL_NAME}')]
+    frames = [] # (seconds since the frame before was saved, server work) of every past frame the server made
+    for folder in folders[-history:]:
+        records = read_journal(folder)
+        try:
+            job = RenderJob(records[0]["job"], folder)
+        except (IndexError, KeyError, TypeError, ValueError): # Not a job journal, or a spec this version can't read
+            continue
+        generated = [record["generated"] for record in records if "generated" in record]
+        if generated: job.total_frames = generated[-1] # An interrupted job's video is shorter than its spec
+        saved = {} # Frame -> when it was saved
+        posted = {} # Frame -> server work, frames from the response cache were never posted
+        with open(f'{folder}/{METRICS_NAME}') as metrics_file:
+            for line in metrics_file:
+                try:
+                    record = json.loads(line)
+                    labels = {name: value for name, value in record.items() if name not in ("stage", "seconds", "time")}
+                    work = job.stage_work(record["stage"], **labels)
+                except (ValueError, KeyError, IndexError, TypeError): # Cut short by a crash, or a frame past the end
+                    continue
+                costs.add(record["stage"], work, record["seconds"])
+                if record["stage"] == "post": posted[labels["frame"]] = work
+                if record["stage"] == "write": saved[labels["frame"]] = record["time"]
+        frames += [(saved[frame] - saved[frame - 1], work) for frame, work in posted.items() if frame in saved and frame - 1 in saved]
+        costs.jobs += 1
+
+    costs.fit()
+    for seconds, work in frames:
+        predicted = costs.predict("post", 1, work)
+        if predicted > 0: costs.frame_ratios.append(seconds / predicted)
+    return costs
+
+def preview_cache(archive_path=None):
+    """The PreviewCache of archive_path (ARCHIVE_PATH by default), one per folder so every thread shares its lock"""
+
+    archive_path = archive_path or ARCHIVE_PATH
+    return preview_caches.setdefault(archive_path, PreviewCache(f'{archive_path}/{PREVIEW_FOLDER_NAME}'))
+
+def archived_jobs(archive_path=None):
+    """Names of the archived videos (their folders in the archive), newest first"""
+
+    archive_path = archive_path or ARCHIVE_PATH
+    if not os.path.isdir(archive_path): return []
+    return [name for name in sorted(os.listdir(archive_path), reverse=True) if os.path.isdir(f'{archive_path}/{name}/frames')]
+
+def archived_previews(name, archive_path=None):
+    """(thumbnail path, preview clip path) of archived video name. Videos archived before previews existed (or whose
+       previews were removed to keep the cache small) get them made from their archived frames first. None if it has none"""
+
+    archive_path = archive_path or ARCHIVE_PATH
+    cache = preview_cache(archive_path)
+    paths = cache.get(name)
+    if paths: return paths
+
+    folder = f'{archive_path}/{name}'
+    frames = len([frame for frame in os.listdir(f'{folder}/frames') if frame.startswith('frame_') and frame.endswith('.png')])
+    records = read_journal(folder)
+    spec = records[0].get("job", {}) if records else {}
+    fps = spec.get("fps", DEFAULT_FPS)
+    upscale_fps = upscaled_fps(fps, spec.get("upscale_fps", DEFAULT_UPSCALED_FPS))
+    if spec.get("upscale", True) and fps < upscale_fps: fps = upscale_fps # Same check as finish_video
+
+    def read_frame(i):
+        with Image.open(f'{folder}/frames/frame_{i}.png') as image:
+            return image.convert('RGB')
+
+    try:
+        return cache.put(name, read_frame, frames, fps)
+    except (OSError, ValueError) as e:
+        print(f"Error making previews of {name}: {e}")
+        return None
+
+def unfinished_job(output_dir):
+    """Returns True if output_dir holds frames of a job that was never archived (see RenderJob.resume)"""
+
+    records = read_journal(output_dir)
+    return bool(records) and "job" in records[0] and not any("archived" in record for record in records)
+
+# INITIALIZATION
+def stop_local_server():
+    """Stops controlnet server through PID. Tries to quite gracefully but forces if unable to"""
+
+    global server_process
+    if server_process:
+        try:
+            print(f"Attempting to stop server process group (bash PID: {server_process.pid})")
+            parent = psutil.Process(server_process.pid)
+            children = parent.children(recursive=True)
+            # Kill child processes first
+            for child in children:
+                print(f"Killing child process: {child.pid} ({child.name()})")
+                child.kill()
+            # Then kill the parent bash process
+            print(f"Killing parent process: {parent.pid} ({parent.name()})")
+            parent.kill()
+            gone, alive = psutil.wait_procs([parent] + children, timeout=5)
+            print(f"Server process and children terminated.")
+            server_process = None
+        except Exception as e:
+            print(f"Failed to stop server: {e}")
+    else:
+        print("No server process tracked.")
+        
+def start_local_server():
+    """Starts the local ControlNet server for image generation without opening a browser."""
+    
+    global server_process
+    try:
+        # Set environment variables to suppress browser and enable API
+        env = os.environ.copy()
+        env["MY_SERVER_TAG"] = "AI_IMG2VID_CONTROLNET_SERVER"
+
+        server_process = subprocess.Popen(
+            ["bash", "webui.sh"],
+            cwd="bin/stable-diffusion-webui",
+            env=env,
+            start_new_session=True,  # important
+            bufsize=1,
+            universal_newlines=True  # Ensures text output is treated as strings
+        )    
+        print(f"Server started with PID {server_process.pid}")
+    except Exception as e:
+        print(f"[ERROR] Failed to start server: {e}")
+
+def clearOutput():
+    """Create necessary directories (first launch) and clear previous output frames (1-n) of the window's job."""
+    
+    # These create necessary folders if first-time user or they are missing
+    if not os.path.exists(OUTPUT_PATH):
+        print(f"Making directory: {OUTPUT_PATH}")
+        os.makedirs(OUTPUT_PATH)
+        print(f"Making directory: {FRAME_PATH}")
+        os.makedirs(FRAME_PATH)
+        starter_gif_path = 'git/starter.gif'
+        if os.path.exists(starter_gif_path): 
+            shutil.copy(starter_gif_path, OUTPUT_GIF_PATH)
+            print(f"Inserting starter gif")
+        starter_seed_path = 'git/seed.png'
+        if os.path.exists(starter_seed_path): 
+            shutil.copy(starter_seed_path, SEED_INPUT_PATH)
+            print(f"Inserting starter seed")
+            
+    if not os.path.exists(ARCHIVE_PATH):
+        os.makedirs(ARCHIVE_PATH)
+        print(f"Making directory: {ARCHIVE_PATH}")
+    if not os.path.exists("input-standby"):
+        os.makedirs("input-standby")
+        print(f"Making directory: input-standby")
+    if os.path.exists('git'): # Removes git folder to save storage space
+        print(f"Removing git folder")
+        shutil.rmtree('git')
+    
+    if unfinished_job(OUTPUT_PATH):
+        print(f"Keeping the frames of an unfinished video in {OUTPUT_PATH}, run with --resume to continue it.")
+        return
+    for frame in os.listdir(FRAME_PATH):
+        full_path = os.path.join(FRAME_PATH, frame)
+        os.remove(full_path)
+
+# IMAGE GENERATION
+class GeneratedFrame:
+    """One frame held in memory as the server sent it. With seed incrementing, the base64 payload goes straight back to the
+       server as the next seed image (no saving, reading back and re-encoding), and the PNG bytes are decoded once, only
+       when the frame gets saved."""
+
+    def __init__(self, frame_num, image_base64, pivot=0, strength=0, cache_key=None):
+        self.frame_num = frame_num
+        self.image_base64 = image_base64
+        self.pivot = pivot
+        self.strength = strength
+        self.cache_key = cache_key # Set if the frame should go in the response cache once it's saved
+        self.cached = False        # True if it came from the response cache instead of the server
+        self._image_bytes = None
+        self._seed_json = None
+
+    @classmethod
+    def from_file(cls, frame_num, path):
+        """Loads a frame from disk (used for the seed image)"""
+
+        with open(path, "rb") as image_file:
+            return cls.from_bytes(frame_num, image_file.read())
+
+    @classmethod
+    def from_bytes(cls, frame_num, image_bytes, pivot=0, strength=0):
+        """Makes a frame from PNG bytes (the seed image, or a frame from the response cache)"""
+
+        frame = cls(frame_num, base64.b64encode(image_bytes).decode("utf-8"), pivot, strength)
+        frame._image_bytes = image_bytes
+        return frame
+
+    @property
+    def image_bytes(self):
+        """Decoded PNG bytes"""
+
+        if self._image_bytes is None:
+            self._image_bytes = base64.b64decode(self.image_base64)
+        return self._image_bytes
+
+    @property
+    def seed_json(self):
+        """The base64 payload as a JSON string, ready to be spliced into a request (see encode_payload)"""
+
+        if self._seed_json is None:
+            self._seed_json = b'"' + self.image_base64.encode("ascii") + b'"'
+        return self._seed_json
+
+def encode_payload(data):
+    """Serializes request data to JSON once, split around the two places the seed image goes (img2img input and ControlNet
+       input). The seed is spliced in at send time with join_payload, so one encoded buffer serves both places instead of
+       json.dumps escaping and copying a megabyte-sized string twice per frame."""
+
+    return json.dumps(data).encode("utf-8").split(json.dumps(SEED_PLACEHOLDER).encode("utf-8"))
+
+def join_payload(pieces, seed_frame):
+    """Builds the request body from encode_payload's pieces and the frame used as the seed image"""
+
+    before, middle, after = pieces
+    return b"".join((before, seed_frame.seed_json, middle, seed_frame.seed_json, after))
+
+def put_until_stopped(frame_queue, item, stop):
+    """Puts item in a bounded queue, waiting for space unless stop gets set first. Returns False if stopped"""
+
+    while not stop.is_set():
+        try:
+            frame_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+# FILE MANAGEMENT
+def mask_frames(frames, folder, alpha, compress_level, store=None):
+    """Saves every frame to folder with its alpha channel replaced by alpha (runs in the mask processes, see apply_masks).
+       frames are (path, slot, name) with the name to save it as, a frame with a slot is read from the frame store (store is
+       its path and shape) instead of its path."""
+
+    mask = Image.fromarray(alpha) if isinstance(alpha, np.ndarray) else int(alpha) # Seed's alpha channel, or one value for every pixel
+    slots = open_slots(*store) if store else None
+    for path, slot, name in frames:
+        img = Image.fromarray(slots[slot]) if slot is not None else Image.open(path).convert("RGBA")
+        img.putalpha(mask) # Same as setting channel 3 in NumPy, without copying the frame
+        img.save(os.path.join(folder, name), compress_level=compress_level)
+
+def file_hash(path):
+    """sha256 of a file's contents, in hex"""
+
+    with open(path, "rb") as frame_file:
+        return hashlib.sha256(frame_file.read()).hexdigest()
+
+def numerical_sort(value):
+    """Helper function to extract the number from a filename for sorting."""
+
+    match = re.search(r'(\d+)', value)  # Find the first number in the string
+    if match:
+        return int(match.group(1))  # Return the number as an integer for proper sorting
+    return value  # If no number is found, return the original value
@@ -0,0 +1,52 @@
+# RENDER EVENTS
+# A job's progress pushed to whoever is watching it (the window) as it happens, instead of being polled. Each event is a
+# snapshot of the job taken on the render thread that made it, with the newest frame already decoded and scaled down, so a
+# listener never reads counters mid-update or touches frame files.
+# type: ignore
+import threading
+import traceback
+
+class EventBus:
+    """Thread safe list of listeners. Listeners are called on the thread that publishes (a render thread), so one that
+       updates a window has to hand the event over to the window's thread (the window uses a queued Qt signal)."""
+
+    def __init__(self):
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def subscribe(self, listener):
+        """Calls listener(event) for every event published from now on"""
+
+        with self.lock:
+            self.listeners = self.listeners + [listener] # Copied, so publishing never holds the lock
+
+    def unsubscribe(self, listener):
+        with self.lock:
+            self.listeners = [other for other in self.listeners if other != listener]
+
+    def publish(self, event):
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception: # A broken listener never stops a render
+                traceback.print_exc()
+
+class RenderEvent:
+    """What just happened to a job, and its progress at that moment. kind is one of:
+       start      generation is starting (thumbnail is the frame it starts from)
+       frame      a generated frame was saved (thumbnail is that frame)
+       upscale    frame pairs were interpolated
+       archived   the finished video is in the archive"""
+
+    def __init__(self, kind, job, thumbnail=None):
+        self.kind = kind
+        self.frame_num = job.generated_frames
+        self.total_frames = job.total_frames
+        self.pivot_num = job.pivot_num
+        self.denoising_strength = job.denoising_strength
+        self.ETA_str = job.ETA_str
+        self.upscaling = job.upscaling
+        self.interpolated_pairs = job.interpolated_pairs
+        self.total_pairs = job.total_pairs
+        self.archive_date = job.date if job.archived else None
+        self.thumbnail = thumbnail # RGB PIL image scaled to fit the job's thumbnail_size, None if no frame came with it
@@ -0,0 +1,62 @@
+# RESPONSE CACHE
+# Generated frames saved on disk under the hash of the request that made them, so a job rendered again with the same
+# inputs gets its frames back without asking the webui. Only makes sense when the sampler seed is pinned, otherwise the
+# server gives a different frame for the same request anyway.
+# type: ignore
+import hashlib
+import os
+
+from diskCache import DiskCache
+
+class ResponseCache(DiskCache):
+    """Content-addressed PNGs in folder (as <first two hex digits>/<sha256 of request body>.png), kept under max_bytes by
+       removing the least recently used ones. Every job shares one cache, so it's thread safe."""
+
+    @staticmethod
+    def key(body):
+        """Cache key of a request body (bytes)"""
+
+        return hashlib.sha256(body).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.folder, key[:2], key + '.png')
+
+    def paths(self, key):
+        return [self.path(key)]
+
+    def stored_keys(self):
+        if not os.path.isdir(self.folder): return
+        for sub_folder in os.listdir(self.folder):
+            sub_path = os.path.join(self.folder, sub_folder)
+            if not os.path.isdir(sub_path): continue # Stray files (.DS_Store...) aren't cache entries
+            try:
+                names = os.listdir(sub_path)
+            except OSError: # Removed or unreadable while listing, the cache works without it
+                continue
+            for name in names:
+                if name.endswith('.png'): yield name[:-4]
+
+    def get(self, key):
+        """PNG bytes cached for key, or None"""
+
+        with self.lock:
+            if not self.touch(key): return None
+            try:
+                with open(self.path(key), 'rb') as image_file:
+                    return image_file.read()
+            except OSError: # Removed by hand
+                self.forget(key)
+                return None
+
+    def put(self, key, image_bytes):
+        """Caches image_bytes under key, then removes the least recently used entries until the cache fits max_bytes"""
+
+        with self.lock:
+            if self.entries is None: self.load()
+            if key in self.entries: return
+            path = self.path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'wb') as image_file:
+                image_file.write(image_bytes)
+            os.replace(path + '.tmp', path) # A crash can't leave half a frame under a valid key
+            self.added(key, len(image_bytes))
@@ -0,0 +1,109 @@
+# STAGE METRICS
+# How long each stage of making a video takes (building requests, the server round trip, decoding, saving, interpolating,
+# masking, encoding), timed with the high resolution monotonic clock. Every measurement is appended to a JSONL file as it
+# happens, and a finished job's summary (p50/p95 per stage) is written in Prometheus' text format.
+# type: ignore
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+class StageMetrics:
+    """Durations by stage for one job. Thread safe, the render pipeline's stages run on different threads."""
+
+    def __init__(self, path):
+        self.path = path   # JSONL file, one {"stage", "seconds", "time", ...labels} object per measurement
+        self.samples = {}  # stage -> list of seconds, in the order they were measured
+        self.lock = threading.Lock()
+        self.metrics_file = None
+
+    @contextmanager
+    def time(self, stage, **labels):
+        """Times the with block as one run of stage (also when it raises). labels go in the JSONL record (e.g. frame=3)"""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, **labels)
+
+    def record(self, stage, seconds, **labels):
+        """Adds one measurement of stage"""
+
+        with self.lock:
+            self.samples.setdefault(stage, []).append(seconds)
+            try:
+                if self.metrics_file is None:
+                    self.metrics_file = open(self.path, 'a', buffering=1) # Line buffered, so the file is readable while rendering
+                self.metrics_file.write(json.dumps({"stage": stage, "seconds": round(seconds, 6), "time": round(time.time(), 3), **labels}) + "\n")
+            except OSError: # Metrics never stop a render
+                pass
+
+    def reset(self):
+        """Forgets every measurement and empties the file (a new job in the same output folder)"""
+
+        with self.lock:
+            self.close_file()
+            self.samples = {}
+            if os.path.exists(self.path): os.remove(self.path)
+
+    def load(self):
+        """Reads back the measurements already in the file, so a resumed job's summary covers the run before it too"""
+
+        with self.lock:
+            self.close_file()
+            self.samples = {}
+            if not os.path.exists(self.path): return
+            with open(self.path) as metrics_file:
+                for line in metrics_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError: # Cut short by a crash
+                        continue
+                    self.samples.setdefault(record["stage"], []).append(record["seconds"])
+
+    def summary(self):
+        """{stage: {"count", "total", "p50", "p95", "max"}} in seconds, stages in the order they first ran"""
+
+        with self.lock:
+            samples = {stage: np.array(seconds) for stage, seconds in self.samples.items()}
+        result = {}
+        for stage, seconds in samples.items():
+            p50, p95 = np.percentile(seconds, [50, 95])
+            result[stage] = {"count": len(seconds), "total": float(seconds.sum()), "p50": float(p50), "p95": float(p95),
+                             "max": float(seconds.max())}
+        return result
+
+    def write_prometheus(self, path, **labels):
+        """Writes the summary to path in Prometheus' text exposition format (a summary metric with 0.5 and 0.95 quantiles
+           per stage). labels are added to every sample, e.g. job="2024-01-01_12-00-00"."""
+
+        extra = ''.join(f',{name}="{value}"' for name, value in labels.items())
+        lines = ["# HELP render_stage_seconds Time spent in each stage of rendering a video.",
+                 "# TYPE render_stage_seconds summary"]
+        for stage, stats in self.summary().items():
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95")):
+                lines.append(f'render_stage_seconds{{stage="{stage}",quantile="{quantile}"{extra}}} {stats[key]:.6f}')
+            lines.append(f'render_stage_seconds_sum{{stage="{stage}"{extra}}} {stats["total"]:.6f}')
+            lines.append(f'render_stage_seconds_count{{stage="{stage}"{extra}}} {stats["count"]}')
+        with open(path, 'w') as prometheus_file:
+            prometheus_file.write("\n".join(lines) + "\n")
+
+    def print_summary(self):
+        for stage, stats in self.summary().items():
+            print(f"  {stage:<12} {stats['count']:6d} x   p50 {stats['p50'] * 1000:9.1f} ms   p95 {stats['p95'] * 1000:9.1f} ms   "
+                  f"total {stats['total']:8.1f} s")
+
+    def close_file(self):
+        if self.metrics_file:
+            self.metrics_file.close()
+            self.metrics_file = None
+
+    def close(self):
+        """Closes the JSONL file (it's opened again if anything else is recorded)"""
+
+        with self.lock:
+            self.close_file()
@@ -0,0 +1,68 @@
+# VIDEO ENCODERS
+# Writers that take frames one at a time and put them straight into the output file, so making a video never needs more
+# than one frame in memory
+# type: ignore
+import imageio
+import numpy as np
+from PIL import Image, GifImagePlugin
+
+GIF_COLORS = 256           # Colours per frame (the most a GIF palette can hold)
+GIF_MIN_DELAY = 2          # Shortest frame delay in 1/100s. Browsers play anything faster at 1/10s, so 60fps plays at 50fps
+MP4_FRAGMENT_SECONDS = 1   # A fragmented MP4 gets a keyframe (and a new fragment) this often
+
+class Mp4Writer:
+    """Writes an H.264 MP4 frame by frame through ffmpeg. Fragmented MP4s are written as a series of short self-contained
+       pieces, so the file can be played while frames are still being added (and survives a crash up to the last piece)."""
+
+    def __init__(self, path, fps, fragmented=True):
+        output_params = []
+        if fragmented:
+            output_params = ['-movflags', 'frag_keyframe+empty_moov+default_base_moof', '-g', str(max(1, round(fps * MP4_FRAGMENT_SECONDS)))]
+        self.writer = imageio.get_writer(path, fps=fps, output_params=output_params)
+
+    def append(self, image):
+        """Adds a PIL image (or RGB array) as the next frame"""
+
+        self.writer.append_data(image if isinstance(image, np.ndarray) else np.asarray(image.convert('RGB')))
+
+    def close(self):
+        """Finishes the video and closes the file"""
+
+        self.writer.close()
+
+class GifWriter:
+    """Writes an animated GIF frame by frame. Every frame is quantized to its own palette as it comes in (stored as a local
+       colour table), instead of holding every frame to build the animation at the end like Image.save(save_all=True)
+       and imageio.mimsave do."""
+
+    def __init__(self, path, fps, loop=0):
+        self.file = open(path, 'wb')
+        self.fps = fps
+        self.loop = loop    # 0 repeats forever
+        self.frames = 0
+        self.delay = 0      # Total delay written so far in 1/100s, so rounding doesn't add up over the video
+
+    def append(self, image):
+        """Adds a PIL image (or RGB array) as the next frame"""
+
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        frame = image.convert('RGB').quantize(colors=GIF_COLORS, method=Image.Quantize.FASTOCTREE) # ~100x faster than median cut
+
+        # GIF delays are whole 1/100s, so e.g. 12fps alternates 8 and 9 to keep the video the right length
+        delay = max(GIF_MIN_DELAY, round((self.frames + 1) * 100 / self.fps) - self.delay)
+        self.delay += delay
+
+        if self.frames == 0:
+            header, _ = GifImagePlugin.getheader(frame, info={"loop": self.loop, "duration": delay * 10})
+            for block in header:
+                self.file.write(block)
+        for block in GifImagePlugin.getdata(frame, duration=delay * 10, include_color_table=True):
+            self.file.write(block)
+        self.frames += 1
+
+    def close(self):
+        """Ends the GIF and closes the file"""
+
+        self.file.write(b';') # GIF trailer
+        self.file.close()
@@ -2,37 +2,23 @@
 # Imports
 # type: ignore
 from PyQt5 import QtWidgets, QtCore
-from PyQt5.QtGui import QMovie, QPixmap
+from PyQt5.QtGui import QMovie, QPixmap, QImage, QIcon
 from PyQt5.QtWidgets import QHBoxLayout, QPushButton, QFileDialog, QWidget, QLayout, QLabel
-from PyQt5.QtCore import Qt
 
-from PIL import Image
 import threading
 import sys as pysys
 import os
 import subprocess
-import requests
-import base64
-from datetime import datetime
-import time
-import psutil
-import shutil
-import numpy as np
-import imageio
-import re
-from io import BytesIO
 import traceback
+import random
+from datetime import datetime
+import renderEngine as engine # Generation itself (runs without the window too, see batchRender.py)
+from renderEngine import (OUTPUT_VIDEO_PATH, OUTPUT_GIF_PATH, ARCHIVE_PATH, FRAME_PATH,
+                          DEFAULT_DENOISING_STRENGTH, DEFAULT_FPS, DEFAULT_STEPS, DEFAULT_CFG_SCALE, DEFAULT_RESOLUTION,
+                          DEFAULT_DURATION, DEFAULT_UPSCALED_FPS, DEFAULT_MINIMUM_DENOISE_STRENGTH)
+from previewCache import THUMBNAIL_SIZE, PREVIEW_CLIP_SIZE
 
 # Persistent Parameters
-# File paths:
-OUTPUT_VIDEO_PATH = 'output/output_video.mp4'          # Where to save output video
-OUTPUT_GIF_PATH = 'output/output_video.gif'            # output gif
-ARCHIVE_PATH = 'output-archive'                        # Folder with all previous output videos/gifs
-FRAME_PATH = 'output/frames'                           # Folder where frames are added
-SEED_INPUT_PATH = 'output/seed_frame.png'              # Previously used seed image (not resized) (default seed path)
-RESIZED_SEED_PATH = f'{FRAME_PATH}/frame_0.png'        # Frame 0 of output (seed image gets resized here)
-RIFE_PATH = 'bin/RIFE-NCNN_Interpolation/rife-ncnn-vulkan' # Frame interpolation software (C++ library)
-
 # Video Generation:
 STYLE_PRESETS = ["Photo Realistic", "Academic Art Still Life", "Surrealism", "Cubism", "Impressionism", 
                  "Fauvism", "Dadaism", "Pixel Art", "Charcoal Still Life", "Japanese Print Art", 
@@ -40,81 +26,40 @@ STYLE_PRESETS = ["Photo Realistic", "Academic Art Still Life", "Surrealism", "Cu
                  "Dark Fantasy", "Psychedelic", "Grafitti", "3D", "Minimalist", "Anime", "Pixel Art", 
                  "Baroque", "Sci-Fi", "Transcendental Painting Group"] # Style presets (dropdown menu)
 
-DEFAULT_DENOISING_STRENGTH = 0.5    # Default denoising strength for image generation
-DEFAULT_FPS = 12                    # Default frames per second for video generation
-DEFAULT_STEPS = 30                  # Default number of steps
-DEFAULT_CFG_SCALE = 25              # Configuration scale (how much model follows prompt)
-DEFAULT_RESOLUTION = [640, 640]     # Default resolution for generated images
-DEFAULT_DURATION = 24               # Default frames between pivots, also is # of context frames for ETA
-DEFAULT_UPSCALED_FPS = 60           # Upscaled FPS
-PROMPT_WEIGHT = 0.6                 # Amount that ControlNet favors consisteny over prompt (lower value -> more prompt weight)
-
 # Fills keyframes with these parameters on launch (other params are default values)
 DEFAULT_PROMPTS = ["black hole acretion disk", "emerging creepy staring faces", "intricate coral reef"]
 DEFAULT_STYLE_NUMS = [2, 8, 10]
 
-# Miscellaneous
-PROGRESS_BAR_LENGTH = 60 # Number of characters in progress bar
-
-NOISESHIFT_C = 0.1  #
-NOISESHIFT_K = 0.2  # Constants for noiseshift equation
-NOISESHIFT_H = -1   #
-
 # Variables
-# Image Generation
-resolution_x = 0  # Width of the generated images
-resolution_y = 0  # Height of the generated images
-prompts = []      # List of prompts for image generation
-timestamps = []   # List of timestamps for each prompt's duration
-noise_amps = []   # List of noise amplitudes for each prompt
-changes = []      # List of indices where prompts change
-styles = []       # List of styles corresponding to each prompt
-fps = 0           # Frames per second for the video
-cfg_scale = 0     # Importance of prompt
-use_original_seed = False # Determines whether every frame will use the original seed image as the image input instead of previous frame.
-mask_base_64 = 0  # Mask for image gen
-upscale = True    # Interpolate frames flag (increases fps)
-upscale_fps = 0   # How many frames are interpolated
-loop = True       # If true, adds the seed image as the last frame and briefly interpolates the last frame to it, creating a subtle loop effect
-minimum_denoise_strength = 0.35 # Prevents denoising strength from getting lower than this value
-
-# Miscellaneous
-# counters
-pivot_num = 0  # Current pivot of the prompt being processed
-generated_frames = 0 # How many frames have been generated
-
-# timers
-generation_start_time = 0  # Start time for image generation
-date = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")  # Date string for naming output files
-
-# other data
-frame_times = []  # List to track generation times for each frame
-total_frames = 0  # Total number of frames to generate
-denoising_strength = 0  # Shift in noise amplitude for image generation
-ETA_str = "N/A" # Used next to progress bar to track ETA in a readable form
-server_process = None # Tracks 
-alpha = 0 # Mask that keeps transparency of seed image
-generating_video_flag = False #
-upscaling_flag = False        # These are just self-explanatory
-play_gif = True               #
-downloading_model = False     #
-display_image_path = RESIZED_SEED_PATH # Tracks the path that the frame display is currently showing
+generating_video_flag = False # True from clicking Generate Video until the video is finished
+downloading_model = False     # True while the ControlNet model downloads
 
 # USER INTERFACE
 class VideoGeneratorUI(QtWidgets.QWidget):
-    def __init__(self):
+    render_event = QtCore.pyqtSignal(object, object) # (RenderEvent, QImage of its frame or None), sent from render threads
+    generation_finished = QtCore.pyqtSignal()        # Sent by the generation thread once the video is done or interrupted
+
+    def __init__(self, resume=False):
         """Runs when program is opened. Does the following:
            - Starts server and checks until it's running.
-           - Erases previously generated frames
+           - Erases previously generated frames (unless they belong to a video that never finished, see --resume)
            - Creates all fields and buttons and connects them to their appropriate function
            - Right panel displays previously generated frame and plays video when finished (NOT IMPLEMENTED)"""
         
         # SETUP
         super().__init__()
-        clearOutput() # Erases previously generated frames except frame_0
+        engine.clearOutput() # Erases previously generated frames except frame_0
 
         self.server_ready_flag = False
+        self.server_answered = False # Set by the server probe thread (see check_server_ready)
+        self.server_probe = None
+        self.resume = resume # Continue the unfinished video in the output folder once the server is ready
+        self.refine = None # Spec of the full video to render next instead of the inputs (see refine_draft)
+        self.job = None # RenderJob being generated (or the last one)
+        self.stop_requested = False # Interrupt was clicked, also before the job existed (see generate_video_ui)
         self.pivot_widgets = []
+        self.render_event.connect(self.show_event)        # Signals from other threads are queued, so these run on the GUI thread
+        self.generation_finished.connect(self.reset)
 
         self.setWindowTitle("AI Video Generator")
         self.showFullScreen()  # Open in fullscreen
@@ -152,12 +97,20 @@ class VideoGeneratorUI(QtWidgets.QWidget):
 
         self.use_original_seed_checkbox = QtWidgets.QCheckBox("Disable Seed Incrementing?") # SEED INCREMENT CHECKBOX
         self.upscale_checkbox = QtWidgets.QCheckBox(f"Interpolate Frames?")
-        self.upscale_checkbox.setChecked(upscale)
+        self.upscale_checkbox.setChecked(True)
         self.upscale_label = QtWidgets.QLabel("Upscaled FPS:")
         self.upscale_fps = QtWidgets.QSpinBox()
         self.upscale_fps.setValue(DEFAULT_UPSCALED_FPS)
         self.loop = QtWidgets.QCheckBox("Seamless Loop?")
-        self.loop.setChecked(loop)
+        self.loop.setChecked(True)
+        self.draft_checkbox = QtWidgets.QCheckBox("Draft Preview?") # Quick low resolution render of the same timeline
+        self.sampler_seed_label = QtWidgets.QLabel("Sampler Seed:")
+        self.sampler_seed_input = QtWidgets.QSpinBox() # SAMPLER SEED INPUT FIELD
+        self.sampler_seed_input.setMinimum(-1)
+        self.sampler_seed_input.setMaximum(2 ** 31 - 1)
+        self.sampler_seed_input.setSpecialValueText("Random") # -1, every video is a new take
+        self.sampler_seed_input.setValue(random.randrange(2 ** 30)) # Pinned for as long as the window is open, so a video
+                                                                  # rendered again after an edit keeps (and caches) its unchanged frames
 
         res_incr_upscale_layout = QtWidgets.QHBoxLayout()
         res_incr_upscale_layout.addWidget(self.resolution_label)
@@ -168,6 +121,9 @@ class VideoGeneratorUI(QtWidgets.QWidget):
         res_incr_upscale_layout.addWidget(self.upscale_label)
         res_incr_upscale_layout.addWidget(self.upscale_fps)
         res_incr_upscale_layout.addWidget(self.loop)
+        res_incr_upscale_layout.addWidget(self.draft_checkbox)
+        res_incr_upscale_layout.addWidget(self.sampler_seed_label)
+        res_incr_upscale_layout.addWidget(self.sampler_seed_input)
 
         # FPS SLIDER
         self.fps_minnoise_layout = QtWidgets.QVBoxLayout()
@@ -179,12 +135,11 @@ class VideoGeneratorUI(QtWidgets.QWidget):
         self.fps_slider.valueChanged.connect(lambda val: self.fps_label.setText(f"FPS: {val}"))
 
         # MINIMUM DENOISE SLIDER
-        global minimum_denoise_strength
         self.min_denoise_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
         self.min_denoise_slider.setMinimum(1)
         self.min_denoise_slider.setMaximum(100)
-        self.min_denoise_slider.setValue(int(minimum_denoise_strength*100))
-        self.min_denoise_label = QtWidgets.QLabel(f"Min. Denoise Strength: {minimum_denoise_strength}")
+        self.min_denoise_slider.setValue(int(DEFAULT_MINIMUM_DENOISE_STRENGTH*100))
+        self.min_denoise_label = QtWidgets.QLabel(f"Min. Denoise Strength: {DEFAULT_MINIMUM_DENOISE_STRENGTH}")
         self.min_denoise_slider.valueChanged.connect(lambda val: self.min_denoise_label.setText(f"Min. Denoise Strength: {val/100}"))
 
         self.fps_minnoise_layout.addWidget(self.fps_label)
@@ -236,6 +191,12 @@ class VideoGeneratorUI(QtWidgets.QWidget):
         self.generate_button = QtWidgets.QPushButton("Generate Video")
         self.generate_button.clicked.connect(self.toggle_generation_thread) # This officially starts video generation when clicked
         self.generate_button.setEnabled(False) # Temporarily disables until server is running
+        self.refine_button = QtWidgets.QPushButton("Refine Draft") # Renders the last draft's video at full quality
+        self.refine_button.clicked.connect(self.refine_draft)
+        self.refine_button.setEnabled(False) # Enabled once a draft is finished
+        generate_layout = QtWidgets.QHBoxLayout()
+        generate_layout.addWidget(self.generate_button, 3)
+        generate_layout.addWidget(self.refine_button, 1)
 
         # Checks twice a second if server is running
         self.server_timer = QtCore.QTimer()
@@ -244,7 +205,6 @@ class VideoGeneratorUI(QtWidgets.QWidget):
         
         self.progress_layout = QtWidgets.QHBoxLayout()
         self.progress_bar = QtWidgets.QProgressBar()
-        global total_frames
         self.progress_bar_label = QtWidgets.QLabel(f"0% Complete - Frame -/-") # Displays progress numerically
         self.progress_layout.addWidget(self.progress_bar)
         self.progress_layout.addWidget(self.progress_bar_label)
@@ -276,7 +236,7 @@ class VideoGeneratorUI(QtWidgets.QWidget):
             self.seed_path_label, self.select_seed_button,
             res_incr_upscale_layout, self.fps_minnoise_layout, 
             self.steps_cfg_layout, QtWidgets.QLabel("Pivots:"), 
-            self.pivot_list, pivot_button_layout, self.generate_button, 
+            self.pivot_list, pivot_button_layout, generate_layout, 
             self.progress_layout, button_layout
         ]:
             if isinstance(element, QWidget): left_panel.addWidget(element)
@@ -289,7 +249,7 @@ class VideoGeneratorUI(QtWidgets.QWidget):
         self.show_generated_gif()
         right_panel.addWidget(self.display_area)
 
-        start_local_server()
+        engine.start_local_server()
         self.download_thread = threading.Thread(target=self.check_model)
         self.download_thread.start()
 
@@ -387,82 +347,63 @@ class VideoGeneratorUI(QtWidgets.QWidget):
                         widget_to_remove['widget'].deleteLater()
 
     def check_server_ready(self):
-        """Checks if server is ready, and enables generate video button if it is"""
-
-        if not self.server_ready_flag:
-            try:
-                response = requests.get("http://127.0.0.1:7860/sdapi/v1/sd-models", timeout=2)
-                if response.status_code == 200:
-                    print("Server is ready! Enabling video generation.")
-                    self.server_ready_flag = True  # Prevent future triggers
-                    self.start_updates()
-                    if not downloading_model: 
-                        self.generate_button.setEnabled(True) # Enable Generate Video button and allow image generation
-            except:
-                pass
+        """Checks if server is ready, and enables generate video button if it is. The servers are probed on another thread
+           (one that can't be reached takes its whole connect timeout to fail), this only reads the answer."""
+
+        if self.server_ready_flag: return
+        if not self.server_answered:
+            if self.server_probe is None or not self.server_probe.is_alive(): # One probe at a time
+                self.server_probe = threading.Thread(target=self.probe_server, daemon=True)
+                self.server_probe.start()
+            return
+        print("Server is ready! Enabling video generation.")
+        self.server_ready_flag = True  # Prevent future triggers
+        if not downloading_model: 
+            self.generate_button.setEnabled(True) # Enable Generate Video button and allow image generation
+            if self.resume: self.toggle_generation_thread()
     
-    def start_updates(self):
-        """Starts a check timer that checks twice a second how to update the progress bar, if at all.
-           Progress is judged by what percent of frames have been generated in the video."""
+    def probe_server(self):
+        """Runs on the server probe thread"""
 
-        self.bar_timer = QtCore.QTimer()
-        self.bar_timer.timeout.connect(self.call_updates) # Helper method
-        self.bar_timer.start(100) # 10 times per second
+        self.server_answered = engine.backends.is_ready()
 
-    def call_updates(self):
-        """Checks where the progress bar should be. Divides how many frames are in the output folder by total_frames.
-           Also updates the image/gif display."""
-        
-        self.update_progress_bar()
-        self.update_display()
+    def send_event(self, event):
+        """Listener of the job being generated, runs on the render thread that sent the event. Its frame (already scaled to
+           fit the display by the job) becomes a QImage here, so the GUI thread only has to put it on screen."""
+
+        image = None
+        if event.thumbnail is not None:
+            width, height = event.thumbnail.size
+            image = QImage(event.thumbnail.tobytes(), width, height, width * 3, QImage.Format_RGB888).copy() # Owns its pixels
+        self.render_event.emit(event, image)
+
+    def show_event(self, event, image):
+        """Redraws the frame display and progress bar for a render event. Runs on the GUI thread, only when something changed"""
 
-    def update_progress_bar(self):
+        if image is not None:
+            self.generated_gif.stop()  # Stop GIF if it was running
+            self.display_area.setPixmap(QPixmap.fromImage(image))
+        self.update_progress_bar(event)
+
+    def update_progress_bar(self, event):
         """Updates the progress bar and label with percentage, frames/total_frames, ETA, and more details"""
 
-        if total_frames == 0: progress = 0
-        else: progress = int(min(generated_frames / total_frames * 100, 100)) # progress is (frames/total frames)*100 which is 0-100
-        self.progress_bar.setValue(progress) # Update bar UI  
-        if upscaling_flag:
-            self.progress_bar_label.setText(f'100% - Frame {generated_frames}/{total_frames + 2} - Upscaling...')
-        else:
-            self.progress_bar_label.setText(f'{progress}% - Frame {generated_frames}/{total_frames} - ETA: {ETA_str} - Denoise: {denoising_strength:.3f}')
-    
-    def update_display(self):
-        """Shows previously generated frame (or seed frame if just started) during video generation.
-           Shows the previously generated gif before/after generation"""
-        
-        global play_gif, display_image_path
-        if generating_video_flag: # If video has not started, progress bar is at 0
-            new_frame = f'{FRAME_PATH}/frame_{generated_frames}.png'
-            if new_frame != display_image_path:
-                display_image_path = new_frame
-                self.show_frame()
-                print(f"Updated image display to {display_image_path}")
+        if event.total_frames == 0: progress = 0
+        else: progress = int(min(event.frame_num / event.total_frames * 100, 100)) # progress is (frames/total frames)*100 which is 0-100
+        self.progress_bar.setValue(progress) # Update bar UI
+        if event.upscaling:
+            self.progress_bar_label.setText(f'100% - Upscaling... {event.interpolated_pairs}/{event.total_pairs} frame pairs')
         else:
-            self.progress_bar.setValue(0)
-            self.progress_bar_label.setText(f"0% Complete - Frame -/-")
-            if play_gif:
-                self.show_generated_gif()
-                play_gif = False
-    
-    def show_frame(self):
-        """Call this during generation to show a frame."""
-
-        global display_image_path
-        self.generated_gif.stop()  # Stop GIF if it was running
-        pixmap = QPixmap(display_image_path)
-        scaled_pixmap = pixmap.scaled( # Scales image to size of panel
-            self.display_area.size(), 
-            Qt.KeepAspectRatio, 
-            Qt.SmoothTransformation
-        )
-        self.display_area.setPixmap(scaled_pixmap)        
-    
+            self.progress_bar_label.setText(f'{progress}% - Frame {event.frame_num}/{event.total_frames} - ETA: {event.ETA_str} - Denoise: {event.denoising_strength:.3f}')
+
     def show_generated_gif(self):
-        """Call this after generation is complete to show the looping GIF."""
+        """Call this after generation is complete to show the looping GIF. Plays the last archived video's low resolution
+           preview clip (see PreviewCache) if it has one, instead of loading the full size GIF."""
 
         print("Updating display to output GIF")
-        self.generated_gif = QMovie(OUTPUT_GIF_PATH)
+        jobs = [self.job.date] if self.job and self.job.archived else engine.archived_jobs()[:1]
+        previews = engine.preview_cache().get(jobs[0]) if jobs else None
+        self.generated_gif = QMovie(previews[1] if previews else OUTPUT_GIF_PATH)
         self.display_area.setMovie(self.generated_gif)
         self.generated_gif.setScaledSize(self.display_area.size())
         self.generated_gif.start()
@@ -470,22 +411,22 @@ class VideoGeneratorUI(QtWidgets.QWidget):
         self.display_area.update()
 
     def toggle_generation_thread(self):
-        """Starts a separate thread that runs method "generate_video_ui" to generate images and video"""
+        """Starts a separate thread that runs method "generate_video_ui" to generate images and video.
+           If it is already running, interrupts it and the thread makes the video out of the frames generated so far."""
 
-        global generating_video_flag, total_frames, generated_frames
+        global generating_video_flag
         if generating_video_flag: 
-            total_frames = generated_frames
-            if loop: 
-                shutil.copy(RESIZED_SEED_PATH, f'{FRAME_PATH}/frame_{total_frames + 1}.png')
-                total_frames += 1
-                generated_frames += 1
-            if upscale and fps < upscale_fps: 
-                self.generate_button.setEnabled(False)
-                interpolate_frames()
-                self.generate_button.setEnabled(True)
-            self.reset()
+            self.generate_button.setEnabled(False) # Re-enabled by reset() once the video is finished
+            self.stop_requested = True # Set before self.job is read, so the generation thread sees one or the other
+            if self.job is not None: self.job.stop()
         else:
             generating_video_flag = True
+            self.job = None
+            self.stop_requested = False
+            self.refine_button.setEnabled(False)
+            self.generate_button.setText("Interrupt Generation") # Disables generate video button to prevent mirror generations
+            size = self.display_area.size()
+            self.thumbnail_size = (size.width(), size.height()) # Frames are scaled to this on the render threads
             self.thread = threading.Thread(target=self.generate_video_ui)
             self.thread.start()
     
@@ -501,10 +442,9 @@ class VideoGeneratorUI(QtWidgets.QWidget):
         noise_amps = []
         timestamps = []
 
-        # If seed image path is left empty, replaces it with the previous seed image (through output/frames)
+        # If seed image path is left empty, uses the previous seed image
         path = self.seed_path_label.text()
-        if path != 'Using previous seed image.':
-            shutil.copy(path, SEED_INPUT_PATH)
+        seed_image = path if path != 'Using previous seed image.' else None
 
         # For every pivot added, loops through and copies the text data from the UI elements into the data structures
         i = 0
@@ -534,6 +474,7 @@ class VideoGeneratorUI(QtWidgets.QWidget):
             "steps": self.steps_slider.value(),
             "cfg_scale": self.cfg_slider.value(),
             "use_original_seed": self.use_original_seed_checkbox.isChecked(),
+            "sampler_seed": self.sampler_seed_input.value(),
             "upscale": self.upscale_checkbox.isChecked(),
             "upscale_fps": self.upscale_fps.value(),
             "loop": self.loop.isChecked(),
@@ -541,63 +482,61 @@ class VideoGeneratorUI(QtWidgets.QWidget):
             "styles": styles,
             "noise_amps": noise_amps,
             "timestamps": timestamps,
+            "seed_image": seed_image,
         }
 
     def generate_video_ui(self):
         """Manages methods outside of class to generate frame-by-frame AI video based off the data inputted in the UI"""
-                
-        clearOutput()
-        self.generate_button.setText("Interrupt Generation") # Disables generate video button to prevent mirror generations
-        inputs = self.collect_inputs() # Helper method that parses input data (currently in UI elements) into usable data structures
-
-        global resolution_x, resolution_y, fps, steps, cfg_scale, upscale, upscale_fps, loop, generation_start_time # import global vars
-        global prompts, styles, noise_amps, timestamps, total_frames, use_original_seed, minimum_denoise_strength
-
-        # Assign global vars to inputs within the UI
-        resolution_x = int(inputs["resolution_x"])
-        resolution_y = int(inputs["resolution_y"])
-        fps = inputs["fps"]
-        minimum_denoise_strength = inputs["minimum_denoise_strength"]
-        steps = inputs["steps"]
-        cfg_scale = inputs["cfg_scale"]
-        prompts = inputs["prompts"]
-        styles = inputs["styles"]
-        noise_amps = inputs["noise_amps"]
-        timestamps = inputs["timestamps"]
-        use_original_seed = inputs["use_original_seed"]
-        upscale = inputs["upscale"]
-        loop = inputs["loop"]
-        upscale_fps = inputs["upscale_fps"]
-        total_frames = timestamps[len(timestamps)-1]
-        generation_start_time = time.time()
-
-        # Resizes seed image to desired resolution so it flows with rest of frames in the video
-        img = Image.open(SEED_INPUT_PATH)
-        new_size = (resolution_x, resolution_y)
-        resized_img = img.resize(new_size)
-        resized_img.save(RESIZED_SEED_PATH)
-        create_mask(RESIZED_SEED_PATH)
-
-        if resized_img.mode == 'RGBA':
-            r, g, b, a = resized_img.split()
-            white_background = Image.new('RGB', resized_img.size, (255, 255, 255))
-            white_background.paste(Image.merge('RGB', (r, g, b)), (0, 0), a)
-            white_background.save(RESIZED_SEED_PATH)
-        self.show_frame()
-
-        generate_images()  # Use stable diffusion and controlnet to generate all frames (TAKES VERY LONG)
-        self.toggle_generation_thread()
+
+        try:
+            if self.resume: # Picks up the frames a crashed or closed run left in the output folder
+                self.resume = False
+                job = engine.RenderJob.resume()
+            else:
+                if self.refine: # The full quality video of the draft that was just watched, whatever the inputs say now
+                    inputs, self.refine = self.refine, None
+                else:
+                    inputs = self.collect_inputs() # Helper method that parses input data (currently in UI elements) into usable data structures
+                    if self.draft_checkbox.isChecked():
+                        inputs = engine.draft_spec(inputs) # Same timeline at lower resolution and steps
+                job = engine.RenderJob(inputs) # Holds the parameters and progress of this video
+                job.clear_output()
+                job.prepare_seed()   # Resizes seed image to desired resolution so it flows with rest of frames in the video
+                job.reuse_frames()   # Keeps frames of the last video that come out the same (e.g. only a later pivot was changed)
+        except ValueError as e:
+            print(f"Error: {e}")
+            self.generation_finished.emit()
+            return
+        if job.archived: # Resumed a video that had finished, its frames and video are in the archive (as with RenderJob.run)
+            print(f"Job in {job.output_dir} already finished, archived as {engine.ARCHIVE_PATH}/{job.date}")
+            self.job = job # Can still be refined if it was a draft
+            self.generation_finished.emit()
+            return
+
+        job.thumbnail_size = self.thumbnail_size
+        job.events.subscribe(self.send_event) # Progress and new frames come as events (see show_event)
+        job.generating = True
+        self.job = job
+        if self.stop_requested: job.stop() # Interrupted while the job was being set up
+        try:
+            job.generate_images()  # Use stable diffusion and controlnet to generate all frames (TAKES VERY LONG)
+            job.finish_video()     # Interpolates, saves video/gif and archives
+        finally:
+            job.generating = False
+            self.generation_finished.emit() # reset() runs on the GUI thread
 
     def download_video(self):
         """Downloads video (gif) to the path of the user's choosing"""
 
+        date = self.job.date if self.job else datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         file, _ = QFileDialog.getSaveFileName(self, "Save Video", date + '.gif', "GIF files (*.gif)") # Names the file as the date with .gif extension
         if file:
             os.rename(OUTPUT_VIDEO_PATH, file) # copies video there
 
     def open_gallery(self):
-        """Opens folder to previous outputs"""
-        open_finder(ARCHIVE_PATH) # Calls helper method
+        """Opens the gallery of previous outputs"""
+        self.gallery = GalleryDialog(self)
+        self.gallery.show()
 
     def show_frames(self):
         """Opens folder to current frames being generated"""
@@ -609,25 +548,28 @@ class VideoGeneratorUI(QtWidgets.QWidget):
         subprocess.run(['open', 'debug.log'])
 
     def reset(self):
-        """Resets program vars after interruption or completion so you don't need to reopen every time.
-           THIS DOES NOT WORK I STILL TO FIX THIS"""
-        
-        global pivot_num, generated_frames, ETA_str, generating_video_flag, upscaling_flag, total_frames, play_gif, display_image_path, date
-        output()           # Saves video and gif to output folder
-        apply_masks()
-        date = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        create_text_file() # Creates file that stores all parameters used to generate that video
-        shutil.copytree('output', f'{ARCHIVE_PATH}/{date}')   # Copies video and gif to archive folder for easy access of previous generations
+        """Resets program vars after interruption or completion so you don't need to reopen every time, and shows the
+           finished video's gif."""
         
+        global generating_video_flag
         generating_video_flag = False
-        upscaling_flag = False
-        play_gif = True
-        pivot_num = 0
-        generated_frames = 0
-        ETA_str = "N/A"
         self.generate_button.setText("Generate Video")
-        total_frames = 0
-        display_image_path = RESIZED_SEED_PATH
+        self.generate_button.setEnabled(True)
+        self.refine_button.setEnabled(bool(self.job and self.job.draft_of and self.job.archived))
+        self.progress_bar.setValue(0)
+        self.progress_bar_label.setText("0% Complete - Frame -/-")
+        self.show_generated_gif()
+
+    def refine_draft(self):
+        """Renders the video the last draft previewed at full quality, with the settings the draft was made from"""
+
+        if generating_video_flag or not (self.job and self.job.draft_of and self.job.archived): return
+        try:
+            self.refine = engine.refine_spec(f'{ARCHIVE_PATH}/{self.job.date}') # Seed image the draft used, not the output folder's
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        self.toggle_generation_thread()
     
     def check_model(self):
         """Downloads model if not already present"""
@@ -650,309 +592,91 @@ class VideoGeneratorUI(QtWidgets.QWidget):
         """Gracefully closes the server as program quits to save 4-6 gigabytes of memory (VERY IMPORTANT)"""
 
         print("Shutting down program...")
-        stop_local_server() # Stops server
+        engine.backends.close()    # Closes pooled connections
+        engine.stop_local_server() # Stops server
         event.accept()
 
-# INITIALIZATION
-def stop_local_server():
-    """Stops controlnet server through PID. Tries to quite gracefully but forces if unable to"""
-
-    global server_process
-    if server_process:
-        try:
-            print(f"Attempting to stop server process group (bash PID: {server_process.pid})")
-            parent = psutil.Process(server_process.pid)
-            children = parent.children(recursive=True)
-            # Kill child processes first
-            for child in children:
-                print(f"Killing child process: {child.pid} ({child.name()})")
-                child.kill()
-            # Then kill the parent bash process
-            print(f"Killing parent process: {parent.pid} ({parent.name()})")
-            parent.kill()
-            gone, alive = psutil.wait_procs([parent] + children, timeout=5)
-            print(f"Server process and children terminated.")
-            server_process = None
-        except Exception as e:
-            print(f"Failed to stop server: {e}")
-    else:
-        print("No server process tracked.")
-        
-def start_local_server():
-    """Starts the local ControlNet server for image generation without opening a browser."""
-    
-    global server_process, date
-    try:
-        # Set environment variables to suppress browser and enable API
-        env = os.environ.copy()
-        env["MY_SERVER_TAG"] = "AI_IMG2VID_CONTROLNET_SERVER"
-
-        server_process = subprocess.Popen(
-            ["bash", "webui.sh"],
-            cwd="bin/stable-diffusion-webui",
-            env=env,
-            start_new_session=True,  # important
-            bufsize=1,
-            universal_newlines=True  # Ensures text output is treated as strings
-        )    
-        print(f"Server started with PID {server_process.pid}")
-    except Exception as e:
-        print(f"[ERROR] Failed to start server: {e}")
-
-def clearOutput():
-    """Clear previous output frames (1-n) and create necessary directories."""
-    
-    # These create necessary folders if first-time user or they are missing
-    if not os.path.exists("output"):
-        print("Making directory: output")
-        os.makedirs("output")
-        print(f"Making directory: {FRAME_PATH}")
-        os.makedirs(FRAME_PATH)
-        starter_gif_path = 'git/starter.gif'
-        if os.path.exists(starter_gif_path): 
-            shutil.copy(starter_gif_path, OUTPUT_GIF_PATH)
-            print(f"Inserting starter gif")
-        starter_seed_path = 'git/seed.png'
-        if os.path.exists(starter_seed_path): 
-            shutil.copy(starter_seed_path, SEED_INPUT_PATH)
-            print(f"Inserting starter seed")
-            
-    if not os.path.exists(ARCHIVE_PATH):
-        os.makedirs(ARCHIVE_PATH)
-        print(f"Making directory: {ARCHIVE_PATH}")
-    if not os.path.exists("input-standby"):
-        os.makedirs("input-standby")
-        print(f"Making directory: input-standby")
-    if os.path.exists('git'): # Removes git folder to save storage space
-        print(f"Removing git folder")
-        shutil.rmtree('git')
-    
-    for frame in os.listdir(FRAME_PATH):
-        full_path = os.path.join(FRAME_PATH, frame)
-        os.remove(full_path)
-
-
-def create_mask(path):
-    """Creates a mask if image has an alpha channel. Only changes image in non-transparent areas."""
-
-    global alpha, mask_base64
-    img = Image.open(path).convert("RGBA")
-    alpha = np.array(img.split()[-1])  # Isolates alpha channel
-    mask_bin = (alpha > 0).astype(np.uint8) * 255  # Binarizes the output
-    mask_image = Image.fromarray(mask_bin).convert("L")
-    buffered = BytesIO()
-    mask_image.save(buffered, format="PNG")
-    mask_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8") # Encodes in base64
-
-def apply_masks():
-    """Post-processing that makes sure all images maintain alpha channel"""
-    
-    print("Applying alpha masks to frames.")
-    for frame in os.listdir(FRAME_PATH):
-        apply_mask(f'{FRAME_PATH}/{frame}')
-
-def apply_mask(image_path):
-    """Applies alpha mask to image at image_path"""
-
-    global alpha
-    img = Image.open(image_path).convert("RGBA")
-    img_np = np.array(img)
-    img_np[..., 3] = alpha
-    result = Image.fromarray(img_np, mode="RGBA")
-    result.save(image_path)
-
-# IMAGE GENERATION
-def generate_image(prompt, style, seed_path):
-    """Generate a single image based on the provided parameters."""
-
-    url = "http://localhost:7860/sdapi/v1/img2img"
-    # Encodes image in base64
-    with open(seed_path, "rb") as seed_image_file:
-        seed_image_bytes = seed_image_file.read()
-        seed_image_base64 = base64.b64encode(seed_image_bytes).decode("utf-8")
-
-    # Prepare request data for server
-    data = {
-        "prompt": f"Very detailed, desaturated. {prompt}, {style} style. Sharp, interesting images emerging from nothing. Realistic, in-focus",
-        "negative_prompt": "Saturated, sharp edges, repeating patterns, nonsense, blurry, fuzzy, nsfw, watermark.", # Can change surrounding prompt to your liking (advanced)
-        "init_images": [seed_image_base64],
-        "denoising_strength": denoising_strength,
-        "steps": steps,
-        "cfg_scale": cfg_scale,
-        "width": resolution_x,
-        "height": resolution_y,
-        "alwayson_scripts": {
-            "controlnet": {
-                "args": [
-                    {
-                    "enabled": True,
-                    "image": seed_image_base64,
-                    "weight": PROMPT_WEIGHT,
-                    "module": "openpose_full",
-                    "model": "control_sd15_hed [fef5e48e]",
-                    }
-                ]
-            }
-        },
-    }
-    try:
-        response = requests.post(url, json=data)
-        response_data = response.json()
-
-        if response.status_code == 200 and "images" in response_data: # If server responds...
-            image_base64 = response_data["images"][0]
-            image_bytes = base64.b64decode(image_base64)
-            image_path = f"{FRAME_PATH}/frame_{generated_frames + 1}.png"
-            with open(image_path, "wb") as image_file:
-                image_file.write(image_bytes) # Save generated frame to folder
-        else:
-            print(f"Error generating image: {response.text}")
-    except Exception as e:
-        print(f"Error during image generation: {e}")
-
-def noiseShift(x, noise_amp):
-    """Adjust noiseshift based on function
-       FORMULA FOR DENOISING STRENGTH: N(x, n) = n - [(n - 0.1) * e^(-0.2[x - 0.5])] where n is pivot's denoise strength, x is current frame of THAT pivot, and N is denoising strength."""
-
-    global denoising_strength, minimum_denoise_strength
-    denoising_strength = noise_amp - (noise_amp - NOISESHIFT_C) * pow(2.71828, -NOISESHIFT_K * (x - NOISESHIFT_H))
-
-    if denoising_strength < minimum_denoise_strength:
-        denoising_strength = minimum_denoise_strength
-
-def generate_images():
-    """Generate a series of images based on the collected prompts and parameters."""
-
-    global denoising_strength, pivot_num, total_frames, generated_frames
-
-    while generated_frames < total_frames:
-        if not generating_video_flag: return # Stops video generation when interrupted
-
-        start_time = int(time.time())
-        if use_original_seed or generated_frames == 0: # If seed incrementation is disabled, uses entered seed image for every frame
-            seed_path = RESIZED_SEED_PATH
-        else: # Otherwise, sets seed image to previously generated frame 
-            seed_path = f"{FRAME_PATH}/frame_{generated_frames}.png"
-
-        last_timestamp = 0
-        if pivot_num != 0: last_timestamp = timestamps[pivot_num - 1]
-
-        noiseShift(generated_frames - last_timestamp, noise_amps[pivot_num]) # Adjusts global denoising_strength variable based on function outlined in method
-        generate_image(prompts[pivot_num], styles[pivot_num], seed_path) # Generates and retrieves output image
-        generated_frames += 1
-        
-        update_debug_progress_bar(start_time)
-
-        # Increment pivot counter and reset frame counter if a new pivot is starting
-        if generated_frames == timestamps[pivot_num]: pivot_num += 1
-
-# UPSCALING
-def interpolate_frames():
-    """Spaces out generated frames and calls a separate AI C++ library to upscale the current video to 60fps"""
-
-    global fps, upscaling_flag, total_frames
-    frame_multiplier = int(upscale_fps / fps)
-    fps = upscale_fps
-    upscaling_flag = True
-
-    # Reorder frames to create space for interpolated frames
-    frames = [0]
-    for i in range(total_frames, 0, -1):
-        new_frame_index = i * frame_multiplier
-        os.rename(f'{FRAME_PATH}/frame_{i}.png', f'{FRAME_PATH}/frame_{new_frame_index}.png')
-        frames.append(new_frame_index)
-
-    # Algorithm iterates through the frame list and interpolates every frame pair and creates a new frame at the place in between them
-    # Loops through frames until all gaps are filled.
-    total_frames *= frame_multiplier
-    for i in range(frame_multiplier - 1):
-        print(f'Iteration {i+1}/{frame_multiplier}\nFrames generated: {frames}')
-        frames_to_add = []
-        for j in range(len(frames) - 1):
-            new_frame_index = frames[j] + int((frames[j + 1] - frames[j]) / 2)
-            if new_frame_index not in frames:
-                print(f'INTERPOLATING FRAMES {frames[j]} AND {frames[j+1]} TO {new_frame_index}')
-                interpolate_frame(f'{FRAME_PATH}/frame_{frames[j]}.png', f'{FRAME_PATH}/frame_{frames[j + 1]}.png', f'{FRAME_PATH}/frame_{new_frame_index}.png')
-                frames_to_add.append(new_frame_index)
-        frames.extend(frames_to_add)
-        frames.sort()
-    interpolate_frame(f'{FRAME_PATH}/frame_1.png', f'{FRAME_PATH}/frame_3.png', f'{FRAME_PATH}/frame_2.png')
-    print(f'Interpolation completed.\nFrames generated: {frames}')
-    upscaling_flag = False
-    
-def interpolate_frame(frame_1_path, frame_2_path, new_frame_path):
-    """Calls RIFE C++ library to interpolate given frames"""
-
-    global generated_frames
-    generated_frames += 1
-    command = [
-        RIFE_PATH,
-        '-0', frame_1_path,      # first frame
-        '-1', frame_2_path,      # second frame
-        '-o', new_frame_path     # output frame
-    ]
-    try:
-        subprocess.run(command, check=True)
-        print(f'Interpolation successful.')
-    except subprocess.CalledProcessError as e:
-        print("Error during interpolation:", e)
+class GalleryDialog(QtWidgets.QDialog):
+    """Archived videos as a grid of thumbnails, newest first. Clicking one plays its preview clip, double clicking opens its
+       folder. Previews (see PreviewCache) are found, or made for videos archived before they existed, on a background
+       thread, so hundreds of videos show up at once and their thumbnails fill in as they're ready."""
+
+    thumbnail_ready = QtCore.pyqtSignal(int, object, str) # (row, QImage thumbnail, preview clip path) from the loader thread
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Gallery")
+        self.resize(1200, 800)
+        self.jobs = engine.archived_jobs()
+        self.clips = {} # Row -> preview clip path, once its previews are ready
+        self.movie = None
+
+        self.job_list = QtWidgets.QListWidget()
+        self.job_list.setViewMode(QtWidgets.QListView.IconMode)
+        self.job_list.setIconSize(QtCore.QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.job_list.setResizeMode(QtWidgets.QListView.Adjust)
+        self.job_list.setMovement(QtWidgets.QListView.Static)
+        self.job_list.setUniformItemSizes(True)
+        for name in self.jobs:
+            self.job_list.addItem(name)
+        self.clip_area = QLabel("Select a video" if self.jobs else "No videos archived yet")
+        self.clip_area.setFixedSize(PREVIEW_CLIP_SIZE, PREVIEW_CLIP_SIZE)
+        self.clip_area.setAlignment(QtCore.Qt.AlignCenter)
+        open_folder_button = QPushButton("Open Folder")
+
+        right_panel = QtWidgets.QVBoxLayout()
+        right_panel.addWidget(self.clip_area)
+        right_panel.addWidget(open_folder_button)
+        right_panel.addStretch()
+        layout = QHBoxLayout(self)
+        layout.addWidget(self.job_list, 1)
+        layout.addLayout(right_panel)
+
+        self.job_list.currentRowChanged.connect(self.play_clip)
+        self.job_list.itemDoubleClicked.connect(self.open_folder)
+        open_folder_button.clicked.connect(self.open_folder)
+        self.thumbnail_ready.connect(self.show_thumbnail) # Queued, runs on the GUI thread
+        self.stop_loading = threading.Event()
+        threading.Thread(target=self.load_previews, daemon=True).start()
+
+    def load_previews(self):
+        """Loader thread: gets every video's previews in order (making them if needed) and reads its thumbnail"""
+
+        for row, name in enumerate(self.jobs):
+            if self.stop_loading.is_set(): return
+            previews = engine.archived_previews(name)
+            if previews:
+                self.thumbnail_ready.emit(row, QImage(previews[0]), previews[1])
+
+    def show_thumbnail(self, row, image, clip):
+        self.clips[row] = clip
+        self.job_list.item(row).setIcon(QIcon(QPixmap.fromImage(image)))
+        if row == self.job_list.currentRow(): self.play_clip(row) # Selected before it was ready
+
+    def play_clip(self, row):
+        """Plays the preview clip of the video in row"""
+
+        if self.movie: self.movie.stop()
+        self.movie = None
+        if row not in self.clips:
+            self.clip_area.setText("Making preview...")
+            return
+        self.movie = QMovie(self.clips[row])
+        self.clip_area.setMovie(self.movie)
+        self.movie.start()
+
+    def open_folder(self):
+        """Opens the selected video's archive folder (the whole archive if none is selected)"""
+
+        row = self.job_list.currentRow()
+        open_finder(f'{ARCHIVE_PATH}/{self.jobs[row]}' if row >= 0 else ARCHIVE_PATH)
+
+    def done(self, result):
+        self.stop_loading.set() # Stops making previews nobody will see
+        if self.movie: self.movie.stop()
+        super().done(result)
 
 # FILE MANAGEMENT
-def numerical_sort(value):
-    """Helper function to extract the number from a filename for sorting."""
-
-    match = re.search(r'(\d+)', value)  # Find the first number in the string
-    if match:
-        return int(match.group(1))  # Return the number as an integer for proper sorting
-    return value  # If no number is found, return the original value
-
-def output():
-    """Generate the output video (.mp4) and GIF from the generated frames."""
-
-    # Removes old output
-    if os.path.exists(OUTPUT_VIDEO_PATH):
-        os.remove(OUTPUT_VIDEO_PATH)
-    if os.path.exists(OUTPUT_GIF_PATH):
-        os.remove(OUTPUT_GIF_PATH)
-
-    # Generate video
-    images = [os.path.join(FRAME_PATH, f) for f in os.listdir(FRAME_PATH) if f.endswith('.png')]
-    images.sort(key=numerical_sort)
-    writer = imageio.get_writer(OUTPUT_VIDEO_PATH, fps=fps)
-    for image in images:
-        writer.append_data(imageio.imread(image))
-    writer.close()
-    print(f"MP4 saved as {OUTPUT_VIDEO_PATH}")
-
-    # Generate gif
-    images = [os.path.join(FRAME_PATH, f) for f in os.listdir(FRAME_PATH) if f.endswith('.png')]
-    images.sort(key=numerical_sort)
-    frames = []
-    for image in images:
-        frames.append(imageio.imread(image))
-    imageio.mimsave(OUTPUT_GIF_PATH, frames, duration=(total_frames/fps), loop=0)
-    print(f"GIF saved as {OUTPUT_GIF_PATH}")
-
-def create_text_file():
-    """Creates a text file with parameters used for the video generation [NOT CONFIRMED TO WORK YET]."""
-
-    generation_end_time = time.time()
-    with open("output/parameters.txt", "w") as file:
-        # Global params/info
-        file.write("Date: " + str(date))
-        file.write("\n\nResolution: " + str(resolution_x) + ' x ' + str(resolution_y))
-        file.write("\nFPS: " + str(fps))
-        file.write("\nSteps: " + str(steps))
-        file.write("\nTime Elapsed: " + str(int(generation_end_time - generation_start_time)) + " seconds")
-        file.write("\nVideo Length: " + str(int(total_frames / fps)) + " seconds")
-        file.write("\nTotal Frames: " + str(total_frames))
-
-        # pivot params
-        for i in range(len(noise_amps)):
-            file.write(f"\n\nSegment {i + 1} Parameters:\n - Prompt: {prompts[i]}\n - Style: {styles[i]}\n - Noise Amplifier: {noise_amps[i]}\n - Duration: {timestamps[i]}")
-        file.write("\n\nDO NOT EDIT THE NAME OR CONTENTS OF THIS FILE")
-        print("Parameter file updated.")
-
 def open_finder(path):
     """Opens a new finder window at a given 'path'."""
 
@@ -960,53 +684,14 @@ def open_finder(path):
         path = os.path.abspath(path)
     subprocess.run(['open', path])
 
-def update_debug_progress_bar(start_time):
-    """Updates a progress bar displayed in the terminal with ETA, frames generated, and image parameters. Not used in window"""
-
-    global ETA_str
-    if total_frames == 0: return
-    percent = generated_frames / total_frames * 100
-    filled_length = int(PROGRESS_BAR_LENGTH * generated_frames // total_frames)
-    bar = '█' * filled_length + '-' * (PROGRESS_BAR_LENGTH - filled_length)
-    
-    print(f'\nPrompt: {prompts[pivot_num]}        Style: {styles[pivot_num]}\n|{bar}| {percent:.2f}% Complete\nFrame: {generated_frames}/{total_frames}' + 
-          f' - Estimated time remaining: {ETA_str}                                   ')
-    print(f'Denoise Strength: {denoising_strength}\nSteps: {steps}\nFPS: {fps}\nCFG Scale: {cfg_scale}')    # Debug logs parameters
-    
-    # Logs time elapsed for estimated time remaining (NOT IMPLEMENTED IN PROGRAM WINDOW)
-    end_time = int(time.time())
-    elapsed_time = end_time - start_time
-    frame_times.append(elapsed_time)
-
-    # Calculates estimated time remaining
-    frames_left = total_frames - generated_frames
-    sum = elapsed_time
-
-    for i in range(generated_frames - DEFAULT_DURATION + 1, generated_frames):
-        if i >= 0 and i < len(frame_times):
-            sum += frame_times[i]
-
-    if generated_frames < DEFAULT_DURATION:
-        avg_time_per_frame = sum / generated_frames
-    else: 
-        avg_time_per_frame = sum / DEFAULT_DURATION
-    ETA_secs = int(frames_left * avg_time_per_frame)
-
-    # Formats into readable text
-    ETA_str = str(ETA_secs) + " secs."
-    if ETA_secs >= 60:
-        ETA_str = str(int(ETA_secs / 60)) + " mins, " + str(ETA_secs % 60) + " secs."
-    if ETA_secs >= 3600:
-        ETA_str = str(int(ETA_secs / 3600)) + " hrs, " + str(int(ETA_secs / 60 % 60)) + " mins, " + str(int(ETA_secs % 60)) + " secs."
-
 # MAIN
 if __name__ == "__main__":
     """Main method that runs everything. Called when program is ran."""
 
-    print(f"Launching program at {date}")
+    print(f"Launching program at {datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}")
     try:
         app = QtWidgets.QApplication(pysys.argv)
-        window = VideoGeneratorUI()
+        window = VideoGeneratorUI(resume='--resume' in pysys.argv) # --resume continues a video that was cut off
         app.exec_()
     except Exception as e:
         print(f"Error: {e}")
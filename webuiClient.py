@@ -0,0 +1,288 @@
+# WEBUI CLIENT
+# Shared HTTP layer for all traffic to the Stable Diffusion webui (img2img, model list, readiness checks)
+# type: ignore
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Persistent Parameters
+DEFAULT_WEBUI_URL = 'http://127.0.0.1:7860'    # Where the webui API is served
+
+IMG2IMG_ENDPOINT = '/sdapi/v1/img2img'          # Generates a frame
+SD_MODELS_ENDPOINT = '/sdapi/v1/sd-models'      # Lists models, also used to check if server is up
+
+# (connect, read) timeouts in seconds per endpoint. img2img can take minutes on slow machines so the read timeout is long
+ENDPOINT_TIMEOUTS = {
+    IMG2IMG_ENDPOINT: (3.05, 600),
+    SD_MODELS_ENDPOINT: (1, 2),
+}
+DEFAULT_TIMEOUT = (3.05, 30)
+
+POOL_SIZE = 4                         # Keep-alive connections kept open per host
+RETRIES = 3                           # Times a failed request is retried before giving up
+RETRY_BACKOFF = 0.5                   # Waits 0.5s, 1s, 2s... between retries
+RETRY_STATUSES = (500, 502, 503, 504) # Server errors worth retrying (webui returns these while a model is (re)loading)
+HEALTH_CHECK_INTERVAL = 10            # Seconds between re-checking a backend that failed
+
+class WebUIError(Exception):
+    """Raised when the webui can't produce a usable response, even after retrying."""
+
+class WebUIClient:
+    """Keeps one pooled, keep-alive requests.Session open to the webui so every frame reuses the same TCP connection
+       instead of reconnecting. Failed requests (connection drops, timeouts, 5xx) are retried with exponential backoff."""
+
+    def __init__(self, base_url=DEFAULT_WEBUI_URL, timeouts=None, retries=RETRIES, backoff=RETRY_BACKOFF, pool_size=POOL_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.retries = retries
+        self.timeouts = dict(ENDPOINT_TIMEOUTS)
+        if timeouts: self.timeouts.update(timeouts)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=None,       # img2img is a POST, retry it too (generating a frame twice is harmless)
+            raise_on_status=False,      # Hand the last response back so its error message can be printed
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.headers.update({'Connection': 'keep-alive'})
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Readiness probes get their own session without retries so a server that is still booting fails fast
+        self.probe_session = requests.Session()
+        self.probe_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+        self.probe_session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+
+    def request(self, method, endpoint, probe=False, **kwargs):
+        """Sends a request to the given endpoint using that endpoint's timeout. Probes (readiness checks) skip retries
+           so a server that is still booting doesn't block the caller."""
+
+        kwargs.setdefault('timeout', self.timeouts.get(endpoint, DEFAULT_TIMEOUT))
+        session = self.probe_session if probe else self.session
+        return session.request(method, self.base_url + endpoint, **kwargs)
+
+    def img2img(self, data=None, body=None):
+        """Sends an img2img request and returns the list of base64 images in the response.
+           Takes either the request data or an already serialized JSON body."""
+
+        if body is None:
+            kwargs = {'json': data}
+        else:
+            kwargs = {'data': body, 'headers': {'Content-Type': 'application/json'}}
+        try:
+            response = self.request('POST', IMG2IMG_ENDPOINT, **kwargs)
+        except requests.RequestException as e:
+            raise WebUIError(f"img2img request failed after {self.retries} retries: {e}") from e
+
+        if response.status_code != 200:
+            raise WebUIError(f"img2img returned {response.status_code}: {response.text}")
+        try:
+            images = response.json()["images"]
+        except (ValueError, KeyError) as e:
+            raise WebUIError(f"img2img response has no images: {response.text[:200]}") from e
+        return images
+
+    def sd_models(self):
+        """Returns the list of models the webui has loaded"""
+
+        response = self.request('GET', SD_MODELS_ENDPOINT)
+        response.raise_for_status()
+        return response.json()
+
+    def is_ready(self):
+        """Returns True if the server is up and answering API calls"""
+
+        try:
+            return self.request('GET', SD_MODELS_ENDPOINT, probe=True).status_code == 200
+        except requests.RequestException:
+            return False
+
+    def close(self):
+        """Closes all pooled connections"""
+
+        self.session.close()
+        self.probe_session.close()
+
+class Backend:
+    """One webui server in a BackendPool, with how many requests it may work on at once"""
+
+    def __init__(self, url, concurrency=1):
+        self.url = url
+        self.concurrency = concurrency
+        self.client = WebUIClient(url, pool_size=max(concurrency, POOL_SIZE))
+        self.active = 0            # Requests currently on this server
+        self.healthy = True
+        self.last_check = 0        # When health was last probed (time.monotonic)
+
+class BackendPool:
+    """Spreads requests over several webui servers (ports or hosts). Each backend has a concurrency limit, backends that
+       fail are health-checked every HEALTH_CHECK_INTERVAL seconds and skipped until they answer again, and idle backends
+       steal queued work from busy ones so a slow server doesn't hold up the rest."""
+
+    def __init__(self, backends):
+        """backends is a list of (url, concurrency) pairs"""
+
+        self.backends = [Backend(url, concurrency) for url, concurrency in backends]
+        self.lock = threading.Condition()
+
+    def is_ready(self):
+        """Returns True if at least one backend is answering"""
+
+        ready = False
+        for backend in self.backends:
+            backend.healthy = backend.client.is_ready()
+            backend.last_check = time.monotonic()
+            ready = ready or backend.healthy
+        return ready
+
+    def recheck(self):
+        """Probes backends that failed and are due another health check. Call without holding the lock"""
+
+        for backend in self.backends:
+            if not backend.healthy and time.monotonic() - backend.last_check >= HEALTH_CHECK_INTERVAL:
+                backend.last_check = time.monotonic()
+                if backend.client.is_ready():
+                    print(f"Backend {backend.url} is back up.")
+                    with self.lock:
+                        backend.healthy = True
+                        self.lock.notify_all()
+
+    def mark_failed(self, backend, error):
+        print(f"Backend {backend.url} failed, skipping it until it answers a health check: {error}")
+        with self.lock:
+            backend.healthy = False
+            backend.last_check = time.monotonic()
+            self.lock.notify_all()
+
+    @contextmanager
+    def lease(self):
+        """Yields the least busy healthy backend that has a free slot, waiting for one if they are all full.
+           Raises WebUIError if no backend is healthy."""
+
+        with self.lock:
+            while True:
+                healthy = [b for b in self.backends if b.healthy]
+                if not healthy: break
+                free = [b for b in healthy if b.active < b.concurrency]
+                if free:
+                    backend = min(free, key=lambda b: b.active / b.concurrency)
+                    backend.active += 1
+                    break
+                self.lock.wait()
+        if not healthy:
+            raise WebUIError("No webui backend is answering.")
+        try:
+            yield backend
+        finally:
+            with self.lock:
+                backend.active -= 1
+                self.lock.notify_all()
+
+    def send(self, request):
+        """Runs request(client) on the least busy backend. If that backend fails, it is marked unhealthy and the request
+           moves to the next one. Raises WebUIError once every backend has failed."""
+
+        while True:
+            self.recheck()
+            with self.lease() as backend:
+                try:
+                    return request(backend.client)
+                except WebUIError as e:
+                    self.mark_failed(backend, e)
+
+    def map(self, tasks, request, on_result, should_stop=lambda task: False):
+        """Runs request(client, task) for every task across all backends, up to each backend's concurrency, and calls
+           on_result(task, result) as each one finishes (in any order, from worker threads). Tasks are dealt out
+           round-robin, and a worker with nothing left steals from the back of the longest other queue.
+           Several maps (one per job) can run at once: queues are per call and the backends' concurrency limits are shared.
+           Returns False if it stopped because every backend failed. Any other error from request or on_result stops every
+           worker and is raised here."""
+
+        run = {"queues": {b: deque() for b in self.backends}, # Work queued on each backend (others steal from the back)
+               "in_flight": 0,                                   # Tasks on a server right now (a failed one is queued again)
+               "failed": False,                                  # Set when every backend has failed
+               "error": None}                                    # Unexpected exception a worker stopped with
+        slots = [b for b in self.backends for _ in range(b.concurrency)]
+        for i, task in enumerate(tasks):
+            run["queues"][slots[i % len(slots)]].append(task)
+
+        workers = [threading.Thread(target=self.work, args=(b, run, request, on_result, should_stop), daemon=True) for b in slots]
+        for worker in workers: worker.start()
+        for worker in workers: worker.join()
+        if run["error"] is not None:
+            raise run["error"]
+        return not run["failed"]
+
+    def next_task(self, backend, queues):
+        """Pops the backend's next task, or steals one from the longest other queue. Call with the lock held"""
+
+        if queues[backend]:
+            return queues[backend].popleft()
+        victim = max(queues.values(), key=len)
+        if victim:
+            return victim.pop()
+        return None
+
+    def work(self, backend, run, request, on_result, should_stop):
+        """Worker thread for one concurrency slot of a backend (see map)"""
+
+        queues = run["queues"]
+        while True:
+            self.recheck()
+            with self.lock:
+                # Done once nothing is queued or on a server, a task in flight can fail and be queued again
+                if run["failed"] or run["error"] or (not any(queues.values()) and run["in_flight"] == 0): return
+                if not backend.healthy or backend.active >= backend.concurrency: # Busy with another job's map, or down
+                    self.lock.wait(HEALTH_CHECK_INTERVAL)                   # (healthy backends take over its queue meanwhile)
+                    continue
+                task = self.next_task(backend, queues)
+                if task is None: # Waits for the tasks in flight, in case one comes back
+                    self.lock.wait(HEALTH_CHECK_INTERVAL)
+                    continue
+                backend.active += 1
+                run["in_flight"] += 1
+
+            if should_stop(task):
+                with self.lock:
+                    backend.active -= 1
+                    run["in_flight"] -= 1
+                    for queue in queues.values(): queue.clear()
+                    self.lock.notify_all()
+                return
+
+            try:
+                try:
+                    result = request(backend.client, task)
+                except WebUIError as e:
+                    self.mark_failed(backend, e)
+                    with self.lock:
+                        queues[backend].appendleft(task) # Put back for a healthy backend to steal
+                        if not any(b.healthy for b in self.backends):
+                            print("Every webui backend has failed, stopping.")
+                            run["failed"] = True
+                    continue
+                finally:
+                    with self.lock:
+                        backend.active -= 1
+                        run["in_flight"] -= 1
+                        self.lock.notify_all() # Wakes waiting workers so they can take a task put back, or exit once nothing is left
+                on_result(task, result)
+            except Exception as e: # Bad response or a bug, the other workers stop too and map raises it
+                with self.lock:
+                    if run["error"] is None: run["error"] = e
+                    self.lock.notify_all()
+                return
+
+    def close(self):
+        """Closes every backend's pooled connections"""
+
+        for backend in self.backends:
+            backend.client.close()